@@ -1,8 +1,34 @@
-from flask import Flask, render_template, jsonify, request
+from flask import (
+    Flask, Response, g, jsonify, make_response, render_template, request, stream_with_context
+)
+import atexit
+import functools
 import hashlib
+import itertools
+import os
 import random
 import time
 import threading
+import queue
+import uuid
+from collections import OrderedDict
+
+from chain_log import ChainLog, export_store
+from block_json import dumps_with_fragments, pos_block_json, pow_block_json
+from block_tree import BlockTree
+from chain_store import HASH_SIZE, PosChainStore, PowChainStore, format_timestamp
+from events import EventBroker
+from fork_montecarlo import run_monte_carlo
+from metrics import BLOCK_TIME_BUCKETS, CONTENT_TYPE, REGISTRY, Counter, Gauge, Histogram
+from offload import Offloader, Overloaded
+from retarget import change_action, make_retarget
+from seeding import make_rng, new_seed
+from sessions import QuotaExceeded, SessionError, SessionManager
+from shared_chain import Coordinator, SharedChain, SharedChainError, SharedChainView
+from sim_tasks import network_race, pos_hash_chain, simulate_fork
+from pow_engine import (
+    SIM_HASH_RATE, ProcessMiningEngine, SimulatedMiningEngine, block_midstate, difficulty_target
+)
 
 app = Flask(__name__)
 
@@ -10,7 +36,13 @@ app = Flask(__name__)
 
 # PoW
 class Block:
-    def __init__(self, index, prev_hash, producer, difficulty, nonce, block_hash, elapsed, attempts):
+    __slots__ = (
+        "index", "prev_hash", "producer", "difficulty", "nonce",
+        "hash", "elapsed", "attempts", "created",
+    )
+
+    def __init__(self, index, prev_hash, producer, difficulty, nonce, block_hash, elapsed, attempts,
+                 created=None):
         self.index = index
         self.prev_hash = prev_hash
         self.producer = producer
@@ -19,283 +51,918 @@ class Block:
         self.hash = block_hash
         self.elapsed = elapsed
         self.attempts = attempts
-        self.timestamp = time.strftime("%H:%M:%S")
+        self.created = created or time.time()
+
+    @property
+    def timestamp(self):
+        return format_timestamp(self.created)
 
 class Miner:
+    # Attempts live in a one-element shard that only the thread mining for
+    # this miner adds to. Setting `attempts` swaps in a new shard, so a thread
+    # still counting into the old one cannot undo a reset.
     def __init__(self, name, hash_power):
         self.name = name
         self.hash_power = hash_power
         self.status = "Idle"
-        self.attempts = 0
+        self._attempts = [0]
+
+    @property
+    def attempts(self):
+        return self._attempts[0]
+
+    @attempts.setter
+    def attempts(self, value):
+        self._attempts = [value]
+
+    def attempt_counter(self):
+        # Fresh shard for one block, owned by the calling thread.
+        self._attempts = shard = [0]
+        return shard
+
+class PowSnapshot:
+    # Immutable view of the PoW state; replaced, never modified.
+    __slots__ = ("chain", "height", "difficulty", "prev_hash", "epoch")
+
+    def __init__(self, chain, height, difficulty, prev_hash, epoch):
+        self.chain = chain
+        self.height = height
+        self.difficulty = difficulty
+        self.prev_hash = prev_hash
+        self.epoch = epoch
+
+    def blocks(self, start=0, stop=None):
+        # Blocks [start, stop) of this snapshot, even while the chain grows.
+        start = max(0, start)
+        stop = self.height if stop is None else min(stop, self.height)
+        return self.chain[start:stop] if start < stop else []
+
+class PowSimulation:
+    # The PoW chain, its tip, difficulty and retargeter. Writers serialize on
+    # `lock` and end by publishing a new PowSnapshot; readers only take
+    # `snapshot`, so status polling never waits for mining. The chain store
+    # fills a row before its length moves, so a snapshot's first `height`
+    # rows stay valid while blocks are appended. reset() swaps in a new store
+    # and bumps `epoch`; a block mined on an older snapshot is dropped.
+    def __init__(self, chain, retarget, difficulty):
+        self.lock = threading.Lock()
+        self.chain = chain
+        self.retarget = retarget
+        self.difficulty = difficulty
+        self.prev_hash = chain.last_hash
+        self.epoch = 0
+        self._publish()
+
+    def _publish(self):
+        self.snapshot = PowSnapshot(
+            self.chain, len(self.chain), self.difficulty, self.prev_hash, self.epoch
+        )
+
+    def append(self, work, miner_name, block_hash, nonce, elapsed, attempts, created=None):
+        # `work` is the snapshot the block was mined on.
+        # -> (block, old difficulty, new difficulty, retarget action), or
+        # None if the chain moved on since `work` was taken.
+        with self.lock:
+            if work.epoch != self.epoch or work.prev_hash != self.prev_hash:
+                return None
+            block = Block(
+                index=len(self.chain) + 1,
+                prev_hash=self.prev_hash,
+                producer=miner_name,
+                difficulty=self.difficulty,
+                nonce=nonce,
+                block_hash=block_hash,
+                elapsed=elapsed,
+                attempts=attempts,
+                created=created
+            )
+            self.chain.append(block)
+            self.prev_hash = block_hash
+
+            old_difficulty = self.difficulty
+            difficulty, action = self.retarget.next_difficulty(old_difficulty, elapsed)
+            self.difficulty = difficulty
+            self._publish()
+        return block, old_difficulty, difficulty, action
+
+    def set_retarget(self, retarget):
+        # Warm the new algorithm up on the end of the chain, then swap it in.
+        with self.lock:
+            retarget.prime(self._tail(getattr(retarget, "window", 1)))
+            self.retarget = retarget
+
+    def _tail(self, count):
+        # (difficulty, elapsed) of the last `count` blocks, read row by row
+        # (from the mapped log of a restored chain) so the rest of the
+        # chain stays unpacked.
+        height = len(self.chain)
+        fields = self.chain.fields
+        difficulty, elapsed = fields.index("difficulty"), fields.index("elapsed")
+        rows = (self.chain.row(i) for i in range(max(0, height - count), height))
+        return [(row[difficulty], row[elapsed]) for row in rows]
+
+    def restore(self):
+        # Continue a reopened chain: tip, warm retargeter, next difficulty.
+        with self.lock:
+            if len(self.chain):
+                tail = self._tail(getattr(self.retarget, "window", 1))
+                self.retarget.prime(tail[:-1])
+                self.difficulty, _ = self.retarget.next_difficulty(*tail[-1])
+            self.prev_hash = self.chain.last_hash
+            self._publish()
+
+    def reset(self, new_chain, difficulty):
+        # new_chain(old chain) -> empty chain; runs under the lock so no
+        # append can reach the old store while its log is truncated.
+        with self.lock:
+            chain = new_chain(self.chain)
+            self.chain = chain
+            self.difficulty = difficulty
+            self.prev_hash = chain.last_hash
+            self.epoch += 1
+            self.retarget.reset()
+            self._publish()
 
 # PoS
 class PosBlock:
-    def __init__(self, index, prev_hash, producer, block_hash):
+    __slots__ = ("index", "prev_hash", "producer", "hash", "created")
+
+    def __init__(self, index, prev_hash, producer, block_hash, created=None):
         self.index = index
         self.prev_hash = prev_hash
         self.producer = producer
         self.hash = block_hash
-        self.timestamp = time.strftime("%H:%M:%S")
+        self.created = created or time.time()
+
+    @property
+    def timestamp(self):
+        return format_timestamp(self.created)
 
 class Validator:
+    # Bumped on every stake change so samplers know when to rebuild.
+    stake_version = 0
+
     def __init__(self, name, stake):
         self.name = name
         self.stake = stake
         self.selected = 0
 
-# Fork (PoW)
-class ForkBlock:
-    def __init__(self, block_id, parent_id):
-        self.block_id = block_id
-        self.parent_id = parent_id
+    @property
+    def stake(self):
+        return self._stake
+
+    @stake.setter
+    def stake(self, value):
+        self._stake = value
+        Validator.stake_version += 1
+
+class StakeSampler:
+    # Weighted proposer selection over a validator list. Cumulative stakes and
+    # the name -> validator index are rebuilt only when a stake or the list
+    # itself changes.
+    def __init__(self, validators, rng=None):
+        self.validators = validators
+        self.rng = rng or random.Random()
+        self._key = None
+        self._cum_weights = []
+        self._by_name = {}
+
+    def _sync(self):
+        key = (Validator.stake_version, len(self.validators))
+        if key != self._key:
+            self._cum_weights = list(itertools.accumulate(v.stake for v in self.validators))
+            self._by_name = {v.name: v for v in self.validators}
+            self._key = key
+
+    def draw(self, k=1):
+        self._sync()
+        return self.rng.choices(self.validators, cum_weights=self._cum_weights, k=k)
+
+    def get(self, name):
+        self._sync()
+        return self._by_name[name]
 
 # Fork PoS
-class PosForkBlock:
-    def __init__(self, block_id, parent_id):
-        self.block_id = block_id
-        self.parent_id = parent_id
-    
-    def __repr__(self):
-        return f"{self.block_id}(parent={self.parent_id})"
-
 class ForkValidator:
     def __init__(self, name, stake):
         self.name = name
         self.stake = stake
 
+# ======================= SHARED CHAIN =======================
+
+# With SHARED_CHAIN=<name>, several server worker processes (gunicorn -w N)
+# serve one default session. The first worker to start is the primary: it
+# owns the simulation and the chain logs. The others are followers (see
+# "SHARED CHAIN - WORKERS" below).
+SHARED_CHAIN = os.environ.get("SHARED_CHAIN")
+# Newest blocks of each chain that followers can read
+SHARED_CHAIN_CAPACITY = int(os.environ.get("SHARED_CHAIN_CAPACITY", 100_000))
+# Key for the workers' coordination socket (shared_chain.Coordinator);
+# unset, one is generated next to the socket.
+SHARED_CHAIN_AUTHKEY = os.environ.get("SHARED_CHAIN_AUTHKEY")
+coordinator = (
+    Coordinator(SHARED_CHAIN, authkey=SHARED_CHAIN_AUTHKEY and SHARED_CHAIN_AUTHKEY.encode())
+    if SHARED_CHAIN else None
+)
+shared_follower = coordinator is not None and not coordinator.primary
+
+# ======================= PERSISTENCE =======================
+
+# When set, the PoW and PoS chains are mirrored to append-only logs in this
+# directory and reopened from there on restart.
+CHAIN_DATA_DIR = os.environ.get("CHAIN_DATA_DIR")
+chain_logs = {}
+
+def open_chain(name, store_class):
+    store = store_class()
+    if CHAIN_DATA_DIR and not shared_follower:
+        if name not in chain_logs:
+            os.makedirs(CHAIN_DATA_DIR, exist_ok=True)
+            path = os.path.join(CHAIN_DATA_DIR, f"{name}.log")
+            chain_logs[name] = ChainLog(path, store_class.record.size)
+        store.attach_log(chain_logs[name])
+    return store
+
+def reset_chain(name, store):
+    # A chain mirrored to a log restarts on the truncated log; session chains
+    # without one just start over in memory. A shared mirror carries over.
+    log, mirror = store.log, store.mirror
+    store.detach_log()
+    store.mirror = None
+    if log is None:
+        new = type(store)()
+    else:
+        log.truncate()
+        new = open_chain(name, type(store))
+    if mirror is not None:
+        new.attach_mirror(mirror)
+    return new
+
+# /pow/export and /pos/export write standalone chain files here
+# (read them with chain_reader.ChainReader).
+CHAIN_EXPORT_DIR = os.environ.get("CHAIN_EXPORT_DIR", "exports")
+
+def export_chain(name, store):
+    os.makedirs(CHAIN_EXPORT_DIR, exist_ok=True)
+    path = os.path.join(CHAIN_EXPORT_DIR, f"{name}-{time.strftime('%Y%m%d-%H%M%S')}.log")
+    export_store(store, path)
+    return {"path": os.path.abspath(path), "blocks": len(store)}
+
+@atexit.register
+def close_chain_logs():
+    for log in chain_logs.values():
+        log.close()
+
+# ======================= SEEDS =======================
+
+# Master seed of the live PoW and PoS runs: SIM_SEED, or a random one that
+# /pow/reset and /pos/reset report and accept (?seed=). RNG streams are
+# derived from it per run and per worker with seeding.make_rng; one-off
+# simulation endpoints take their own "seed".
+SIM_SEED = os.environ.get("SIM_SEED")
+
+def request_seed(data):
+    # "seed" from a JSON body or query string, else a fresh one.
+    seed = data.get("seed")
+    return new_seed() if seed is None else int(seed)
+
 # ======================= GLOBAL STATE - POW =======================
 
-miners = [
-    Miner("Alice", 1.0),
-    Miner("Bob", 1.5),
-    Miner("Carol", 0.7),
-    Miner("Tom", 2.0),
-    Miner("Harry", 1.3),
-    Miner("Jessica", 0.5)
-]
-
-pow_blockchain = []
-pow_difficulty = 4
+POW_MINERS = (
+    ("Alice", 1.0),
+    ("Bob", 1.5),
+    ("Carol", 0.7),
+    ("Tom", 2.0),
+    ("Harry", 1.3),
+    ("Jessica", 0.5),
+)
+
+POW_INITIAL_DIFFICULTY = 4
 target_time = 3.0
-pow_prev_hash = "0" * 64
-mining_flag = False
-lock = threading.Lock()
+# Difficulty retargeting (retarget.py): "step" (legacy), "window", "ema", "lwma"
+POW_RETARGET = os.environ.get("POW_RETARGET", "step")
+# "thread": one GIL-bound thread per miner, "process": ProcessMiningEngine,
+# "simulated": SimulatedMiningEngine (sampled block times, no hashing)
+POW_BACKENDS = ("thread", "process", "simulated")
+POW_SIM_MAX_BLOCKS = 1_000_000
+# Min seconds between two "miners" progress events
+POW_PROGRESS_INTERVAL = 0.5
+# Max pause between two mined blocks (/pow/start?delay=)
+POW_MAX_BLOCK_DELAY = 60.0
+# How long /pow/start and session close wait for a stopped mining loop
+POW_STOP_TIMEOUT = 2 * POW_PROGRESS_INTERVAL
+# Larger PoS batches are announced by height only; clients page /pos/status
+POS_EVENT_MAX_BLOCKS = 100
 
 # ======================= GLOBAL STATE - POS =======================
 
-validators = [
-    Validator("Val_A", 10),
-    Validator("Val_B", 30),
-    Validator("Val_C", 60),
-]
+POS_VALIDATORS = (
+    ("Val_A", 10),
+    ("Val_B", 30),
+    ("Val_C", 60),
+)
 
-pos_chain = []
-pos_prev_hash = "0" * 64
+# Bulk slot generation jobs
+POS_JOB_BATCH = 10000
+POS_JOB_HISTORY = 50
 
 # ======================= GLOBAL STATE - FORK =======================
 
-fork_blocks = {}
 fork_nodes = ["Node1", "Node2", "Node3", "Node4", "Node5"]
-node_tip = {}
-canonical_chain = []
+FORK_MAX_BRANCHES = 26
+FORK_MAX_DEPTH = 100000
+FORK_MC_MAX_TRIALS = 10_000_000
+FORK_MC_MAX_NODES = 100000
+NETSIM_MAX_BLOCKS = 10000
+
+# ======================= OFFLOAD =======================
+
+# CPU-heavy simulations (sim_tasks.py) run on SIM_WORKERS processes so they
+# do not hold the GIL of the process serving status calls and mining:
+# /fork_pow/simulate with depth >= FORK_OFFLOAD_DEPTH or a network,
+# /fork_pow/network, and the hashing of PoS batches of POS_OFFLOAD_SLOTS or
+# more. /pow/simulate (which advances the session's own chain) and the Monte
+# Carlo runs (which fan out on their own pool) keep their threads but take
+# an offloader slot too. Beyond SIM_MAX_PENDING running or queued, requests
+# get a 503 with Retry-After and bulk jobs wait. SIM_WORKERS=0 runs
+# everything inline.
+SIM_WORKERS = int(os.environ.get("SIM_WORKERS", min(4, os.cpu_count() or 1)))
+SIM_MAX_PENDING = int(os.environ.get("SIM_MAX_PENDING", 16))
+SIM_RETRY_AFTER = 1
+FORK_OFFLOAD_DEPTH = 1000
+POS_OFFLOAD_SLOTS = 5000
+
+offloader = Offloader(SIM_WORKERS, SIM_MAX_PENDING)
+atexit.register(offloader.shutdown)
+
+def offload_if(heavy, fn, *args):
+    # fn(*args) on the offload pool when `heavy`, else on this thread.
+    return offloader.run(fn, *args) if heavy else fn(*args)
+
+# ======================= SESSIONS =======================
+
+# Requests run against the shared "default" session (the one persisted to
+# CHAIN_DATA_DIR) unless they name another: X-Session header, ?session=, or
+# the cookie the HTML pages hand out. Other sessions live in memory, are
+# evicted least recently used first (sessions.py) and have quotas.
+SESSION_COOKIE = "sim_session"
+SESSION_MAX = int(os.environ.get("SESSION_MAX", 64))
+SESSION_IDLE_TIMEOUT = float(os.environ.get("SESSION_IDLE_TIMEOUT", 1800))
+# Per session: blocks in each chain, running PoS jobs
+SESSION_MAX_BLOCKS = int(os.environ.get("SESSION_MAX_BLOCKS", 500_000))
+SESSION_MAX_JOBS = 2
+# Sessions mining at the same time, over all sessions
+SESSION_MAX_MINING = int(os.environ.get("SESSION_MAX_MINING", 8))
+# Sessions mining with the "process" backend at the same time, over all
+# sessions; each one runs a pool of cpu_count processes while it mines.
+SESSION_MAX_PROCESS_MINING = int(os.environ.get("SESSION_MAX_PROCESS_MINING", 1))
+
+class Session:
+    # One isolated simulation: PoW chain and miners, PoS chain and
+    # validators, both fork demos, their workers and event streams.
+    # `max_blocks` caps each chain (None: unlimited).
+    def __init__(self, session_id, seed, pow_chain=None, pos_chain=None, max_blocks=None):
+        self.session_id = session_id
+        self.max_blocks = max_blocks
+        self.last_used = time.time()
+
+        # PoW: chain, tip and difficulty are read through pow_sim.snapshot
+        self.pow_seed = seed
+        self.miners = [Miner(name, power) for name, power in POW_MINERS]
+        self.pow_sim = PowSimulation(
+            pow_chain if pow_chain is not None else PowChainStore(),
+            make_retarget(POW_RETARGET, target_time),
+            POW_INITIAL_DIFFICULTY
+        )
+        self.mining_flag = False
+        self.mining_stop = threading.Event()  # ends the pause between blocks
+        self.pow_backend = "thread"
+        # Pause between two mined blocks, in seconds (0 = mine back to back)
+        self.pow_block_delay = 1.0
+        # Persistent workers: kept alive across blocks and across start/stop
+        self.miner_queues = {}
+        self.miner_done = queue.Queue()
+        self.pow_engine = None
+        self.pow_sim_engine = None
+        self.mining_thread = None
+        # Push streams for /pow/stream and /pos/stream
+        self.pow_events = EventBroker()
+        self.pow_progress_sent = 0.0
+
+        # PoS
+        self.pos_seed = seed
+        self.validators = [Validator(name, stake) for name, stake in POS_VALIDATORS]
+        self.pos_chain = pos_chain if pos_chain is not None else PosChainStore()
+        self.pos_prev_hash = self.pos_chain.last_hash
+        self.pos_sampler = StakeSampler(self.validators, make_rng(seed, "pos"))
+        self.pos_lock = threading.RLock()
+        self.pos_jobs = {}  # job id -> PosJob
+        self.pos_events = EventBroker()
+
+        # Fork demos: the last result of the PoW one, the last tree of the PoS one
+        self.node_tip = {}
+        self.canonical_chain = []
+        self.fork_pos_blocks = BlockTree("GEN")
+        self.fork_validators = []
+
+    @property
+    def busy(self):
+        # Running work, or a dashboard following one of the streams.
+        return (self.mining_flag
+                or any(j.finished is None for j in list(self.pos_jobs.values()))
+                or self.pow_events.has_subscribers()
+                or self.pos_events.has_subscribers())
+
+    def stop_mining(self):
+        # The loop notices within one POW_PROGRESS_INTERVAL, or at once when
+        # it is pausing between blocks.
+        self.mining_flag = False
+        self.mining_stop.set()
+
+    def check_blocks(self, height, count):
+        # Quota check before `count` more blocks on a chain of `height`.
+        if self.max_blocks is not None and height + count > self.max_blocks:
+            raise QuotaExceeded(f"session chains are limited to {self.max_blocks} blocks")
+
+    def close(self):
+        # Stop everything the session runs: mining loop, workers, PoS jobs.
+        self.stop_mining()
+        for job in list(self.pos_jobs.values()):
+            job.cancel()
+        if self.mining_thread is not None:
+            self.mining_thread.join(timeout=POW_STOP_TIMEOUT)
+        for q in self.miner_queues.values():
+            q.put(None)
+        release_mining_engine(self)
+        self.pow_events.publish("closed", {"session": self.session_id})
+        self.pos_events.publish("closed", {"session": self.session_id})
+
+    def to_dict(self):
+        return {
+            "session": self.session_id,
+            "idle": round(time.time() - self.last_used, 1),
+            "busy": self.busy,
+            "mining": self.mining_flag,
+            "pow_height": self.pow_sim.snapshot.height,
+            "pos_height": len(self.pos_chain),
+            "max_blocks": self.max_blocks,
+        }
+
+default_session = Session(
+    "default",
+    int(SIM_SEED) if SIM_SEED else new_seed(),
+    pow_chain=open_chain("pow", PowChainStore),
+    pos_chain=open_chain("pos", PosChainStore)
+)
+
+def new_session(session_id):
+    return Session(session_id, new_seed(), max_blocks=SESSION_MAX_BLOCKS)
+
+def session_closed(session, reason):
+    sessions_closed.labels(reason).inc()
+
+sessions = SessionManager(new_session, SESSION_MAX, SESSION_IDLE_TIMEOUT, on_close=session_closed)
+atexit.register(sessions.close_all)
+
+def requested_session_id():
+    return (request.headers.get("X-Session") or request.args.get("session")
+            or request.cookies.get(SESSION_COOKIE))
+
+def current_session():
+    session_id = requested_session_id()
+    if not session_id or session_id == default_session.session_id:
+        return default_session
+    return sessions.get(session_id)
+
+def all_sessions():
+    return [default_session] + sessions.sessions()
+
+def mining_sessions():
+    return sum(s.mining_flag for s in all_sessions())
+
+# ======================= METRICS =======================
+# Exported at /metrics (metrics.py). Recorded once per block, batch or
+# request over all sessions; miners only touch their own attempt counters
+# while hashing. Chain gauges describe the default session.
+
+pow_hashes = Counter("pow_hashes_total", "Hashes computed (or simulated) per miner.", ["miner"])
+pow_hash_rate = Gauge("pow_miner_hash_rate", "Hashes per second of each miner over its last block.", ["miner"])
+pow_blocks = Counter("pow_blocks_total", "PoW blocks appended, by winning miner.", ["miner"])
+pow_block_time = Histogram(
+    "pow_block_interval_seconds", "Time taken to mine each PoW block.", buckets=BLOCK_TIME_BUCKETS
+)
+pow_difficulty_changes = Counter(
+    "pow_difficulty_changes_total", "PoW difficulty retargets by direction.", ["direction"]
+)
+pow_difficulty_gauge = Gauge("pow_difficulty", "Difficulty of the next PoW block.")
+pow_height_gauge = Gauge("pow_chain_height", "Blocks in the PoW chain.")
+pos_slots = Counter("pos_slots_total", "PoS slots produced.")
+pos_slot_rate = Gauge("pos_slots_per_second", "Slots per second of the last PoS batch.")
+pos_height_gauge = Gauge("pos_chain_height", "Blocks in the PoS chain.")
+fork_sim_time = Histogram("fork_simulation_seconds", "Duration of fork simulations.", ["kind"])
+http_request_time = Histogram(
+    "http_request_duration_seconds", "Flask request latency by route.", ["method", "route", "status"]
+)
+sessions_gauge = Gauge("sim_sessions", "Live sessions besides the default one.")
+sessions_mining_gauge = Gauge("sim_sessions_mining", "Sessions with a mining loop running.")
+sessions_closed = Counter("sim_sessions_closed_total", "Sessions closed, by reason.", ["reason"])
+status_requests = Counter(
+    "status_cache_total", "Status bodies serialized (built) and polls answered with 304.", ["result"]
+)
+offload_pending = Gauge("sim_offload_pending", "Offloaded simulations running or queued.")
+offload_rejected = Counter("sim_offload_rejected_total", "Simulation requests refused with 503.")
+
+@REGISTRY.on_collect
+def collect_chain_gauges():
+    snap = default_session.pow_sim.snapshot
+    pow_difficulty_gauge.set(snap.difficulty)
+    pow_height_gauge.set(snap.height)
+    pos_height_gauge.set(len(default_session.pos_chain))
+    sessions_gauge.set(len(sessions))
+    sessions_mining_gauge.set(mining_sessions())
+    offload_pending.set(offloader.pending)
+
+def record_pow_round(session, elapsed):
+    # After each block attempt (won or stopped): add every miner's attempts.
+    for m in session.miners:
+        pow_hashes.labels(m.name).inc(m.attempts)
+        if elapsed > 0:
+            pow_hash_rate.labels(m.name).set(m.attempts / elapsed)
+
+# ======================= SERIALIZATION =======================
+
+def miners_json(session):
+    return [
+        {"name": m.name, "status": m.status, "attempts": m.attempts}
+        for m in session.miners
+    ]
 
-# Fork PoS
-fork_pos_blocks = {}
-fork_validators = []
+def validators_json(session, total):
+    return [
+        {
+            "name": v.name,
+            "stake": v.stake,
+            "selected": v.selected,
+            "percentage": round((v.selected / total) * 100, 2) if total > 0 else 0
+        }
+        for v in session.validators
+    ]
 
 # ======================= POW CORE =======================
 
-def mine_worker(miner: Miner, event_stop, result_holder):
-    global pow_difficulty, pow_prev_hash
-
-    prefix = "0" * pow_difficulty
-    nonce = 0
-    start_time = time.time()
-
-    miner.status = "Mining"
-    miner.attempts = 0
-
-    while not event_stop.is_set():
-        miner.attempts += 1
-
-        msg = f"{pow_prev_hash}|{nonce}|{miner.name}".encode()
-        h = hashlib.sha256(msg).hexdigest()
-
-        if h.startswith(prefix):
-            elapsed = time.time() - start_time
-            with lock:
-                if not event_stop.is_set():
-                    result_holder["winner"] = (miner.name, h, nonce, elapsed, miner.attempts)
-                    event_stop.set()
-                    return
-        nonce += random.randint(1, 3)
-
-    miner.status = "Stopped"
-
-def adjust_difficulty(difficulty, block_time):
-    if block_time < target_time * 0.5:
-        return difficulty + 1, "Increase"
-    elif block_time > target_time * 2:
-        return max(1, difficulty - 1), "Decrease"
-    return difficulty, "Stable"
-
-def auto_mine():
-    global mining_flag, pow_prev_hash, pow_difficulty
-
-    while mining_flag:
-        threads = []
-        stop_event = threading.Event()
-        result_holder = {}
-
-        for m in miners:
-            t = threading.Thread(target=mine_worker, args=(m, stop_event, result_holder))
-            threads.append(t)
-            t.start()
-
-        for t in threads:
-            t.join()
-
-        if "winner" not in result_holder:
-            continue
-
-        miner_name, block_hash, nonce, elapsed, attempts = result_holder["winner"]
-
-        with lock:
-            height = len(pow_blockchain) + 1
-
-            block = Block(
-                index=height,
-                prev_hash=pow_prev_hash,
-                producer=miner_name,
-                difficulty=pow_difficulty,
-                nonce=nonce,
-                block_hash=block_hash,
-                elapsed=elapsed,
-                attempts=attempts
-            )
-
-            pow_blockchain.append(block)
-            pow_prev_hash = block_hash
-
-            pow_difficulty, _ = adjust_difficulty(pow_difficulty, elapsed)
-
-        time.sleep(1)
+def mine_worker(miner: Miner, work_queue, done_queue):
+    # Long-lived worker: one thread per miner, fed one work item per block.
+    while True:
+        item = work_queue.get()
+        if item is None:  # session closed
+            return
+        event_stop, result_holder, prev_hash, difficulty, nonce, rng = item
+
+        base, suffix = block_midstate(prev_hash, miner.name)
+        target = difficulty_target(difficulty)
+        start_time = time.time()
+
+        miner.status = "Mining"
+        attempts = miner.attempt_counter()
+
+        while not event_stop.is_set():
+            attempts[0] += 1
+
+            h = base.copy()
+            h.update(str(nonce).encode() + suffix)
+
+            if h.digest() < target:
+                h = h.hexdigest()
+                elapsed = time.time() - start_time
+                # setdefault is atomic: the first finder wins, without a lock.
+                result_holder.setdefault("winner", (miner.name, h, nonce, elapsed, attempts[0]))
+                event_stop.set()
+                break
+            nonce += rng.randint(1, 3)
+        else:
+            miner.status = "Stopped"
+
+        done_queue.put(miner.name)
+
+def set_retarget(session, algorithm, **params):
+    retarget = make_retarget(algorithm, target_time, **params)
+    session.pow_sim.set_retarget(retarget)
+    return retarget
+
+def append_pow_block(session, work, miner_name, block_hash, nonce, elapsed, attempts, created=None):
+    # `work`: the pow_sim snapshot the block was mined on.
+    appended = session.pow_sim.append(work, miner_name, block_hash, nonce, elapsed, attempts, created)
+    if appended is None:
+        return None
+    block, old_difficulty, new_difficulty, action = appended
+
+    pow_blocks.labels(miner_name).inc()
+    pow_block_time.observe(elapsed)
+    if action != "Stable":
+        pow_difficulty_changes.labels(action.lower()).inc()
+
+    events = session.pow_events
+    if events.has_subscribers():
+        events.publish("block", {"block": pow_block_json(block), "miners": miners_json(session)})
+        if action != "Stable":
+            events.publish("difficulty", {
+                "old": old_difficulty, "new": new_difficulty, "action": action
+            })
+    return block
+
+def pow_keep_mining(session):
+    # Polled by the mining loops while a block is in progress.
+    now = time.time()
+    if session.pow_events.has_subscribers() and now - session.pow_progress_sent >= POW_PROGRESS_INTERVAL:
+        session.pow_progress_sent = now
+        session.pow_events.publish("miners", {"miners": miners_json(session)})
+    return session.mining_flag
+
+def ensure_miner_workers(session):
+    for m in session.miners:
+        if m.name not in session.miner_queues:
+            session.miner_queues[m.name] = queue.Queue()
+            threading.Thread(
+                target=mine_worker, args=(m, session.miner_queues[m.name], session.miner_done),
+                daemon=True
+            ).start()
+
+def mine_with_threads(session, work):
+    ensure_miner_workers(session)
+    stop_event = threading.Event()
+    result_holder = {}
+
+    for m in session.miners:
+        rng = make_rng(session.pow_seed, "pow", m.name, work.prev_hash)
+        session.miner_queues[m.name].put(
+            (stop_event, result_holder, work.prev_hash, work.difficulty, 0, rng)
+        )
+
+    while not stop_event.wait(POW_PROGRESS_INTERVAL):
+        if not pow_keep_mining(session):
+            stop_event.set()
+
+    for _ in session.miners:
+        session.miner_done.get()
+
+    return result_holder.get("winner")
+
+# A session holds a ProcessMiningEngine (and one of the
+# SESSION_MAX_PROCESS_MINING places) only while its mining loop runs.
+process_engines = threading.BoundedSemaphore(max(1, SESSION_MAX_PROCESS_MINING))
+process_engines_lock = threading.Lock()
+
+def get_mining_engine(session):
+    with process_engines_lock:
+        if session.pow_engine is None:
+            if not process_engines.acquire(blocking=False):
+                raise QuotaExceeded(
+                    f"at most {SESSION_MAX_PROCESS_MINING} sessions can mine with the process backend at once"
+                )
+            session.pow_engine = ProcessMiningEngine()
+        return session.pow_engine
+
+def release_mining_engine(session):
+    # Stops the engine's processes; the next process run starts new ones.
+    with process_engines_lock:
+        engine, session.pow_engine = session.pow_engine, None
+        if engine is None:
+            return
+        process_engines.release()
+    engine.shutdown()
+
+def get_simulated_engine(session):
+    # The simulated clock carries on from the last block of the chain.
+    if session.pow_sim_engine is None:
+        snap = session.pow_sim.snapshot
+        clock = snap.blocks(snap.height - 1)[0].created if snap.height else None
+        session.pow_sim_engine = SimulatedMiningEngine(
+            SIM_HASH_RATE, clock, make_rng(session.pow_seed, "pow-sim")
+        )
+    return session.pow_sim_engine
+
+def mine_simulated(session, count):
+    # `count` blocks in simulated time; difficulty is retargeted per block
+    # on the simulated block times, exactly as in real mining.
+    engine = get_simulated_engine(session)
+    pow_sim = session.pow_sim
+    for _ in range(count):
+        work = pow_sim.snapshot
+        winner = engine.mine_block(session.miners, work.prev_hash, work.difficulty)
+        record_pow_round(session, winner[3])
+        append_pow_block(session, work, *winner, created=engine.clock)
+
+def auto_mine(session):
+    keep_mining = functools.partial(pow_keep_mining, session)
+    try:
+        while session.mining_flag:
+            work = session.pow_sim.snapshot
+            try:
+                session.check_blocks(work.height, 1)
+            except QuotaExceeded:
+                session.mining_flag = False
+                break
+
+            if session.pow_backend == "simulated":
+                mine_simulated(session, 1)
+            else:
+                started = time.time()
+                if session.pow_backend == "process":
+                    winner = get_mining_engine(session).mine_block(
+                        session.miners, work.prev_hash, work.difficulty, keep_mining
+                    )
+                else:
+                    winner = mine_with_threads(session, work)
+                record_pow_round(session, time.time() - started)
+
+                if winner is None:
+                    continue
+
+                append_pow_block(session, work, *winner)
+
+            if session.pow_block_delay > 0:
+                session.mining_stop.wait(session.pow_block_delay)
+    finally:
+        # However the loop ended (stop, quota, an error), the session is no
+        # longer mining and /pow/start can run it again.
+        session.mining_flag = False
+        for m in session.miners:
+            if m.status == "Mining":
+                m.status = "Stopped"
+        release_mining_engine(session)
 
 # ======================= POS CORE =======================
 
-def select_validator():
-    names = [v.name for v in validators]
-    weights = [v.stake for v in validators]
-    return random.choices(names, weights=weights, k=1)[0]
-
-def create_pos_block(height):
-    global pos_prev_hash
+def select_validator(session):
+    return session.pos_sampler.draw()[0].name
 
-    chosen = select_validator()
+def create_pos_block(session, height):
+    with session.pos_lock:
+        session.check_blocks(len(session.pos_chain), 1)
+        chosen = select_validator(session)
+        session.pos_sampler.get(chosen).selected += 1
 
-    for v in validators:
-        if v.name == chosen:
-            v.selected += 1
-
-    h = hashlib.sha256(f"{pos_prev_hash}|{chosen}|{height}".encode()).hexdigest()
-    blk = PosBlock(height, pos_prev_hash, chosen, h)
+        prev_hash = session.pos_prev_hash
+        h = hashlib.sha256(f"{prev_hash}|{chosen}|{height}".encode()).hexdigest()
+        blk = PosBlock(height, prev_hash, chosen, h)
 
-    pos_chain.append(blk)
-    pos_prev_hash = h
+        session.pos_chain.append(blk)
+        session.pos_prev_hash = h
 
+    pos_slots.inc()
+    publish_pos_blocks(session, [blk])
     return blk
 
-# ======================= FORK CORE =======================
-
-def compute_chain_length(blocks, tip):
-    length = 0
-    cur = tip
-    while cur is not None:
-        length += 1
-        parent = blocks[cur].parent_id
-        if parent is None:
-            break
-        cur = parent
-    return length
-
-def get_chain_path(blocks, tip):
-    path = []
-    cur = tip
-    while cur is not None:
-        path.append(cur)
-        parent = blocks[cur].parent_id
-        if parent is None:
-            break
-        cur = parent
-    return list(reversed(path))
-
-def simulate_fork():
-    global fork_blocks, node_tip, canonical_chain
-
-    fork_blocks = {}
-    node_tip = {}
-    canonical_chain = []
-
-    fork_blocks["GEN"] = ForkBlock("GEN", None)
-
-    fork_blocks["A1"] = ForkBlock("A1", "GEN")
-    fork_blocks["B1"] = ForkBlock("B1", "GEN")
-
-    for n in fork_nodes:
-        latA = random.uniform(0, 1)
-        latB = random.uniform(0, 1)
-
-        if latA < latB:
-            node_tip[n] = {
-                "picked": "A1",
-                "latA": latA,
-                "latB": latB
-            }
+def create_pos_blocks(session, count, wait=False):
+    # Same chain as `count` create_pos_block() calls, but all proposers are
+    # drawn in one batched call. Batches of POS_OFFLOAD_SLOTS or more are
+    # hashed on the offload pool; wait=True waits for a free slot there
+    # instead of raising Overloaded.
+    if count >= POS_OFFLOAD_SLOTS and offloader.workers:
+        with offloader.slot(wait):
+            return create_pos_blocks_offloaded(session, count)
+
+    with session.pos_lock:
+        prev_hash = session.pos_prev_hash
+        height = len(session.pos_chain)
+        session.check_blocks(height, count)
+        created = time.time()
+        sha256 = hashlib.sha256
+        blocks = []
+
+        for v in session.pos_sampler.draw(count):
+            height += 1
+            v.selected += 1
+            h = sha256(f"{prev_hash}|{v.name}|{height}".encode()).hexdigest()
+            blocks.append(PosBlock(height, prev_hash, v.name, h, created))
+            prev_hash = h
+
+        session.pos_chain.extend(blocks)
+        session.pos_prev_hash = prev_hash
+
+    pos_slots.inc(count)
+    duration = time.time() - created
+    if duration > 0:
+        pos_slot_rate.set(count / duration)
+    publish_pos_blocks(session, blocks)
+    return blocks
+
+def create_pos_blocks_offloaded(session, count):
+    # The proposers are drawn here, the hash chain is computed in a worker
+    # process and the rows go into the store in one piece; the blocks
+    # returned are views of the stored rows.
+    with session.pos_lock:
+        height = len(session.pos_chain)
+        session.check_blocks(height, count)
+        created = time.time()
+        drawn = session.pos_sampler.draw(count)
+        names = [v.name for v in drawn]
+        digests = offloader.call(pos_hash_chain, session.pos_prev_hash, names, height)
+
+        for v in drawn:
+            v.selected += 1
+        session.pos_chain.extend_digests(digests, names, created)
+        session.pos_prev_hash = digests[-HASH_SIZE:].hex()
+        blocks = session.pos_chain[height:height + count]
+
+    pos_slots.inc(count)
+    duration = time.time() - created
+    if duration > 0:
+        pos_slot_rate.set(count / duration)
+    publish_pos_blocks(session, blocks)
+    return blocks
+
+def publish_pos_blocks(session, blocks):
+    if not session.pos_events.has_subscribers() or not blocks:
+        return
+    height = blocks[-1].index
+    data = {"height": height, "validators": validators_json(session, height)}
+    if len(blocks) <= POS_EVENT_MAX_BLOCKS:
+        data["blocks"] = [pos_block_json(b) for b in blocks]
+    session.pos_events.publish("blocks", data)
+
+class PosJob:
+    # Background bulk slot generation, built in batches so it can report
+    # progress and be cancelled between two batches.
+    def __init__(self, session, slots, batch_size=POS_JOB_BATCH):
+        self.job_id = uuid.uuid4().hex[:12]
+        self.session = session
+        self.slots = slots
+        self.batch_size = batch_size
+        self.done = 0
+        self.state = "queued"
+        self.error = None
+        self.started = None
+        self.finished = None
+        self.cancel_event = threading.Event()
+
+    def run(self):
+        # Always ends with `finished` set, so a failed job never keeps its
+        # session busy or counts against SESSION_MAX_JOBS.
+        self.state = "running"
+        self.started = time.time()
+        try:
+            while self.done < self.slots:
+                if self.cancel_event.is_set():
+                    self.state = "cancelled"
+                    break
+                n = min(self.batch_size, self.slots - self.done)
+                create_pos_blocks(self.session, n, wait=True)
+                self.done += n
+            else:
+                self.state = "completed"
+        except QuotaExceeded as e:
+            self.state = "failed"
+            self.error = str(e)
+        except Exception as e:
+            self.state = "failed"
+            self.error = f"{type(e).__name__}: {e}"
+        finally:
+            self.finished = time.time()
+
+    def cancel(self):
+        self.cancel_event.set()
+
+    def to_dict(self):
+        if self.started is None:
+            elapsed = 0.0
         else:
-            node_tip[n] = {
-                "picked": "B1",
-                "latA": latA,
-                "latB": latB
-            }
-
-    countA = sum(1 for n in fork_nodes if node_tip[n]["picked"] == "A1")
-    countB = len(fork_nodes) - countA
-
-    parent_for_C2 = random.choices(
-        ["A1", "B1"], weights=[countA, countB], k=1
-    )[0]
-
-    fork_blocks["C2"] = ForkBlock("C2", parent_for_C2)
-
-    tip_A = "C2" if parent_for_C2 == "A1" else "A1"
-    tip_B = "C2" if parent_for_C2 == "B1" else "B1"
-
-    lenA = compute_chain_length(fork_blocks, tip_A)
-    lenB = compute_chain_length(fork_blocks, tip_B)
-
-    if lenA > lenB:
-        canonical_chain = get_chain_path(fork_blocks, tip_A)
-    elif lenB > lenA:
-        canonical_chain = get_chain_path(fork_blocks, tip_B)
-    else:
-        canonical_chain = get_chain_path(fork_blocks, random.choice([tip_A, tip_B]))
-
-    return {
-        "nodes": node_tip,
-        "countA": countA,
-        "countB": countB,
-        "C2_parent": parent_for_C2,
-        "chainA_tip": tip_A,
-        "chainB_tip": tip_B,
-        "lenA": lenA,
-        "lenB": lenB,
-        "canonical_chain": canonical_chain
-    }
+            elapsed = (self.finished or time.time()) - self.started
+
+        result = {
+            "job_id": self.job_id,
+            "state": self.state,
+            "slots": self.slots,
+            "done": self.done,
+            "progress": round(self.done / self.slots * 100, 2) if self.slots else 100.0,
+            "elapsed": round(elapsed, 3),
+            "slots_per_sec": round(self.done / elapsed, 1) if elapsed > 0 else 0
+        }
+        if self.error is not None:
+            result["error"] = self.error
+        return result
+
+def start_pos_job(session, slots, batch_size):
+    jobs = session.pos_jobs
+    running = sum(j.finished is None for j in list(jobs.values()))
+    if session.max_blocks is not None and running >= SESSION_MAX_JOBS:
+        raise QuotaExceeded(f"at most {SESSION_MAX_JOBS} running jobs per session")
+    session.check_blocks(len(session.pos_chain), slots)
+
+    job = PosJob(session, slots, batch_size)
+    jobs[job.job_id] = job
+
+    finished = [j for j in jobs.values() if j.finished is not None]
+    for j in finished[:max(0, len(finished) - POS_JOB_HISTORY)]:
+        del jobs[j.job_id]
+
+    threading.Thread(target=job.run, daemon=True).start()
+    return job
 
 # ======================= FORK POS CORE =======================
 
-def run_pos_fork_sim():
-    global fork_pos_blocks, fork_validators
+def run_pos_fork_sim(session, rng=None):
+    rng = rng or random.Random()
     
     # 1. Khởi tạo validators
     fork_validators = [
@@ -306,10 +973,9 @@ def run_pos_fork_sim():
         ForkValidator("Val_E", 15),
     ]
     
-    fork_pos_blocks = {}
-    fork_pos_blocks["GEN"] = PosForkBlock("GEN", None)
-    fork_pos_blocks["A1"] = PosForkBlock("A1", "GEN")
-    fork_pos_blocks["B1"] = PosForkBlock("B1", "GEN")
+    blocks = BlockTree("GEN")
+    blocks.add("A1", "GEN")
+    blocks.add("B1", "GEN")
     
     validator_rows = []
     validator_choice = {}
@@ -318,8 +984,8 @@ def run_pos_fork_sim():
     
     # 3. Mỗi validator "nhìn" A1/B1 với latency khác nhau rồi vote
     for v in fork_validators:
-        latA = random.uniform(0, 1)
-        latB = random.uniform(0, 1)
+        latA = rng.uniform(0, 1)
+        latB = rng.uniform(0, 1)
         
         if latA < latB:
             choice = "A1"
@@ -345,18 +1011,19 @@ def run_pos_fork_sim():
         canonical_tip = "B1"
         loser_tip = "A1"
     else:
-        canonical_tip = random.choice(["A1", "B1"])
+        canonical_tip = rng.choice(["A1", "B1"])
         loser_tip = "B1" if canonical_tip == "A1" else "A1"
     
-    canonical_chain_pos = get_chain_path(fork_pos_blocks, canonical_tip)
+    canonical_chain_pos = blocks.path(canonical_tip)
     
     # 5. Sinh thêm block C2 trên canonical branch bằng PoS (weighted random)
     names = [v.name for v in fork_validators]
     stakes = [v.stake for v in fork_validators]
-    chosen_validator = random.choices(names, weights=stakes, k=1)[0]
+    chosen_validator = rng.choices(names, weights=stakes, k=1)[0]
     
-    fork_pos_blocks["C2"] = PosForkBlock("C2", canonical_tip)
-    final_chain = get_chain_path(fork_pos_blocks, "C2")
+    blocks.add("C2", canonical_tip)
+    session.fork_pos_blocks, session.fork_validators = blocks, fork_validators
+    final_chain = blocks.path("C2")
     
     result = {
         "validators": validator_rows,
@@ -374,173 +1041,800 @@ def run_pos_fork_sim():
 
 # ======================= ROUTES - MAIN =======================
 
+def session_page(template):
+    # Every browser gets its own session, kept in a cookie that the page's
+    # API calls then send. When no session can be created the page falls
+    # back to the shared default one. With SHARED_CHAIN a session would only
+    # exist in the worker that rendered the page, so every page uses the
+    # default session, which all workers serve.
+    response = make_response(render_template(template))
+    if SHARED_CHAIN:
+        if SESSION_COOKIE in request.cookies:
+            response.delete_cookie(SESSION_COOKIE)
+        return response
+    session_id = request.cookies.get(SESSION_COOKIE)
+    if session_id:
+        try:
+            sessions.get(session_id)
+            return response
+        except SessionError:
+            response.delete_cookie(SESSION_COOKIE)
+    try:
+        session = sessions.create()
+    except QuotaExceeded:
+        return response
+    response.set_cookie(SESSION_COOKIE, session.session_id, httponly=True, samesite="Lax")
+    return response
+
 @app.route("/")
 def index():
     return render_template("index.html")
 
 @app.route("/pow")
 def pow_page():
-    return render_template("pow.html")
+    return session_page("pow.html")
 
 @app.route("/pos")
 def pos_page():
-    return render_template("pos.html")
+    return session_page("pos.html")
 
 @app.route("/fork_pow")
 def fork_page():
-    return render_template("fork_pow.html")
+    return session_page("fork_pow.html")
 
 @app.route("/fork_pos")
 def fork_pos_page():
-    return render_template("fork_pos.html")
+    return session_page("fork_pos.html")
+
+# ======================= ROUTES - SESSIONS =======================
+
+@app.errorhandler(SessionError)
+def unknown_session(e):
+    return jsonify({"error": str(e)}), 404
+
+@app.errorhandler(Overloaded)
+def simulations_overloaded(e):
+    offload_rejected.inc()
+    response = jsonify({"error": str(e)})
+    response.headers["Retry-After"] = str(SIM_RETRY_AFTER)
+    return response, 503
+
+@app.errorhandler(QuotaExceeded)
+def quota_exceeded(e):
+    return jsonify({"error": str(e)}), 429
+
+@app.route("/session", methods=["POST"])
+def session_create():
+    session = sessions.create()
+    response = jsonify(session.to_dict())
+    response.set_cookie(SESSION_COOKIE, session.session_id, httponly=True, samesite="Lax")
+    return response, 201
+
+@app.route("/session")
+def session_info():
+    return jsonify(current_session().to_dict())
+
+@app.route("/session", methods=["DELETE"])
+def session_delete():
+    session = current_session()
+    if session is default_session:
+        return jsonify({"error": "the default session cannot be deleted"}), 400
+    sessions.remove(session.session_id)
+    response = jsonify({"status": "deleted", "session": session.session_id})
+    response.delete_cookie(SESSION_COOKIE)
+    return response
+
+@app.route("/sessions")
+def session_list():
+    return jsonify({
+        "sessions": [s.to_dict() for s in all_sessions()],
+        "limits": {
+            "sessions": SESSION_MAX,
+            "idle_timeout": SESSION_IDLE_TIMEOUT,
+            "blocks": SESSION_MAX_BLOCKS,
+            "jobs": SESSION_MAX_JOBS,
+            "mining": SESSION_MAX_MINING,
+            "process_mining": SESSION_MAX_PROCESS_MINING,
+        }
+    })
 
 # ======================= ROUTES - POW =======================
 
 @app.route("/pow/start")
 def pow_start():
-    global mining_flag
-    if not mining_flag:
-        mining_flag = True
-        threading.Thread(target=auto_mine, daemon=True).start()
-    return jsonify({"status": "started"})
+    session = current_session()
+    backend = request.args.get("backend", session.pow_backend)
+    if backend not in POW_BACKENDS:
+        return jsonify({"error": f"unknown backend '{backend}'"}), 400
+    try:
+        delay = float(request.args.get("delay", session.pow_block_delay))
+    except ValueError:
+        delay = -1
+    if not 0 <= delay <= POW_MAX_BLOCK_DELAY:
+        return jsonify({"error": f"delay must be a number in 0..{POW_MAX_BLOCK_DELAY:g}"}), 400
+
+    session.pow_block_delay = delay
+    if not session.mining_flag:
+        if mining_sessions() >= SESSION_MAX_MINING:
+            raise QuotaExceeded(f"at most {SESSION_MAX_MINING} sessions can mine at once")
+        # A previous loop notices stop_mining() within one poll; never run two.
+        if session.mining_thread is not None:
+            session.mining_thread.join(timeout=POW_STOP_TIMEOUT)
+            if session.mining_thread.is_alive():
+                return jsonify({"error": "the previous mining run is still stopping, retry"}), 409
+        if backend == "process":
+            get_mining_engine(session)  # 429 now rather than in the loop
+        session.pow_backend = backend
+        session.mining_stop.clear()
+        session.mining_flag = True
+        session.mining_thread = threading.Thread(target=auto_mine, args=(session,), daemon=True)
+        session.mining_thread.start()
+    return jsonify({"status": "started", "backend": session.pow_backend, "delay": session.pow_block_delay})
+
+@app.route("/pow/simulate", methods=["POST"])
+def pow_simulate():
+    # Body: {"blocks": N, "hash_rate": simulated hashes/s per unit of hash_power}
+    session = current_session()
+    data = request.get_json(silent=True) or {}
+    try:
+        blocks = int(data.get("blocks", 1000))
+        hash_rate = float(data.get("hash_rate", SIM_HASH_RATE))
+    except (TypeError, ValueError):
+        blocks = hash_rate = -1
+    if not 1 <= blocks <= POW_SIM_MAX_BLOCKS or hash_rate <= 0:
+        return jsonify({"error": f"blocks must be 1..{POW_SIM_MAX_BLOCKS}, hash_rate > 0"}), 400
+    if session.mining_flag:
+        return jsonify({"error": "stop mining first"}), 409
+    session.check_blocks(session.pow_sim.snapshot.height, blocks)
+
+    engine = get_simulated_engine(session)
+    engine.hash_rate = hash_rate
+    start = session.pow_sim.snapshot
+    start_clock = engine.clock
+    started = time.time()
+
+    with offloader.slot():
+        mine_simulated(session, blocks)
+
+    elapsed = time.time() - started
+    simulated = engine.clock - start_clock
+    end = session.pow_sim.snapshot
+    return jsonify({
+        "blocks": blocks,
+        "height": end.height,
+        "start_height": start.height,
+        "simulated_seconds": round(simulated, 3),
+        "mean_block_time": round(simulated / blocks, 3),
+        "difficulty": {"start": start.difficulty, "end": end.difficulty},
+        "elapsed": round(elapsed, 3),
+        "blocks_per_sec": round(blocks / elapsed, 1) if elapsed > 0 else None
+    })
+
+@app.route("/pow/retarget", methods=["GET", "POST"])
+def pow_retarget_route():
+    # POST {"algorithm": "lwma", "window": 45, "interval": ...}
+    session = current_session()
+    if request.method == "POST":
+        data = dict(request.get_json(silent=True) or {})
+        algorithm = data.pop("algorithm", session.pow_sim.retarget.name)
+        try:
+            params = {k: int(data[k]) for k in ("window", "interval") if k in data}
+            set_retarget(session, algorithm, **params)
+        except (TypeError, ValueError) as e:
+            return jsonify({"error": str(e)}), 400
+    return jsonify(dict(session.pow_sim.retarget.params(), difficulty=session.pow_sim.snapshot.difficulty))
 
 @app.route("/pow/stop")
 def pow_stop():
-    global mining_flag
-    mining_flag = False
+    current_session().stop_mining()
     return jsonify({"status": "stopped"})
 
+# Max blocks returned by one /pow/status or /pos/status call
+STATUS_PAGE_LIMIT = 1000
+
+def chain_page(chain, height=None, oldest=0):
+    # ?since_height=H&limit=N -> JSON fragments of the blocks with height > H,
+    # at most N of them. Heights start at 1 and match list positions, so this
+    # is a plain slice, cut at `height` when reading a snapshot of a growing
+    # chain. A shared chain only keeps blocks from list position `oldest` on;
+    # blocks overwritten meanwhile are left out at the front of the page.
+    since = int(request.args.get("since_height", 0))
+    limit = int(request.args.get("limit", STATUS_PAGE_LIMIT))
+    since = max(oldest, since)
+    limit = max(1, min(limit, STATUS_PAGE_LIMIT))
+
+    height = len(chain) if height is None else height
+    stop = min(since + limit, height)
+    page = chain.fragments(since, stop) if since < height else []
+    next_height = stop if page else since
+    return page, {
+        "height": height,
+        "since_height": since,
+        "next_height": next_height,
+        "has_more": next_height < height
+    }
+
+# Status bodies are serialized once per state version and shared by every
+# client asking for the same page, and carry an ETag, so a poll that finds
+# nothing new gets an empty 304. The version is the chain tip (plus
+# difficulty and miner states for PoW) and a counter epoch: miner attempt
+# counters in a /pow/status body advance in steps of STATUS_COUNTER_INTERVAL
+# seconds.
+STATUS_CACHE_SIZE = 256
+STATUS_COUNTER_INTERVAL = 2.0
+status_cache = OrderedDict()  # (path, session, query) -> (version, etag, body)
+status_cache_lock = threading.Lock()
+
+def counter_epoch():
+    return int(time.monotonic() / STATUS_COUNTER_INTERVAL)
+
+def cached_status(session, version, build):
+    # build() -> (response dict, "blockchain" fragments), called only when
+    # `version` changed.
+    key = (request.path, session.session_id, request.query_string)
+    with status_cache_lock:
+        entry = status_cache.get(key)
+        if entry is not None:
+            status_cache.move_to_end(key)
+
+    if entry is None or entry[0] != version:
+        try:
+            data, page = build()
+        except ValueError:
+            return jsonify({"error": "since_height and limit must be integers"}), 400
+        body = dumps_with_fragments(data, "blockchain", page)
+        entry = (version, hashlib.blake2b(body, digest_size=12).hexdigest(), body)
+        with status_cache_lock:
+            status_cache[key] = entry
+            status_cache.move_to_end(key)
+            while len(status_cache) > STATUS_CACHE_SIZE:
+                status_cache.popitem(last=False)
+        status_requests.labels("built").inc()
+
+    response = Response(entry[2], mimetype="application/json")
+    response.set_etag(entry[1])
+    response.cache_control.no_cache = True
+    response.make_conditional(request)
+    if response.status_code == 304:
+        status_requests.labels("not_modified").inc()
+    return response
+
 @app.route("/pow/status")
 def pow_status():
-    return jsonify({
-        "miners": [
-            {"name": m.name, "status": m.status, "attempts": m.attempts}
-            for m in miners
-        ],
-        "blockchain": [
-            {
-                "height": b.index,
-                "miner": b.producer,
-                "difficulty": b.difficulty,
-                "nonce": b.nonce,
-                "attempts": b.attempts,
-                "time": round(b.elapsed, 3),
-                "hash": b.hash,
-                "timestamp": b.timestamp
-            } for b in pow_blockchain
-        ],
-        "difficulty": pow_difficulty
-    })
+    session = current_session()
+    if shared_follower and session is default_session:
+        view, meta = shared_view("pow")
+        difficulty = meta.get("difficulty", POW_INITIAL_DIFFICULTY)
+        version = (view.shared.generation, len(view), difficulty, counter_epoch())
+
+        def build():
+            page, cursor = chain_page(view, oldest=view.oldest)
+            return {
+                **cursor,
+                "miners": meta.get("miners", []),
+                "difficulty": difficulty
+            }, page
+    else:
+        snap = session.pow_sim.snapshot
+        version = (snap.epoch, snap.prev_hash, snap.difficulty,
+                   tuple(m.status for m in session.miners), counter_epoch())
+
+        def build():
+            page, cursor = chain_page(snap.chain, snap.height)
+            return {
+                **cursor,
+                "miners": miners_json(session),
+                "difficulty": snap.difficulty
+            }, page
+    return cached_status(session, version, build)
+
+def event_stream(broker, hello):
+    # Subscribed before the response starts so nothing published after
+    # `hello` is missed; released on close even if the body is never read
+    # (HEAD, a client gone before the first chunk).
+    sub = broker.subscribe()
+    response = Response(
+        stream_with_context(broker.stream(sub, hello)),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+    response.call_on_close(lambda: broker.unsubscribe(sub))
+    return response
+
+def pow_stream_source():
+    # (broker, hello) of /pow/stream for this request; also used by asgi.py.
+    session = current_session()
+    if shared_follower and session is default_session:
+        view, meta = shared_view("pow")
+        hello = {"height": len(view), "difficulty": meta.get("difficulty", POW_INITIAL_DIFFICULTY)}
+    else:
+        snap = session.pow_sim.snapshot
+        hello = {"height": snap.height, "difficulty": snap.difficulty}
+    return session.pow_events, hello
+
+@app.route("/pow/stream")
+def pow_stream():
+    # Push: "block", "difficulty", "miners" (attempt counters), "reset" and
+    # "closed" (session evicted).
+    return event_stream(*pow_stream_source())
+
+def export_name(name, session):
+    return name if session is default_session else f"{name}-{session.session_id}"
+
+@app.route("/pow/export", methods=["POST"])
+def pow_export():
+    session = current_session()
+    return jsonify(export_chain(export_name("pow", session), session.pow_sim.snapshot.chain))
 
 @app.route("/pow/reset")
 def pow_reset():
-    global pow_blockchain, pow_difficulty, pow_prev_hash, mining_flag
-    mining_flag = False
-    pow_blockchain = []
-    pow_difficulty = 4
-    pow_prev_hash = "0" * 64
-    for m in miners:
+    session = current_session()
+    try:
+        seed = request_seed(request.args)
+    except ValueError:
+        return jsonify({"error": "seed must be an integer"}), 400
+    session.stop_mining()
+    session.pow_seed = seed
+    # A block still being mined on the old chain is dropped by pow_sim.
+    session.pow_sim.reset(lambda chain: reset_chain("pow", chain), POW_INITIAL_DIFFICULTY)
+    session.pow_sim_engine = None
+    for m in session.miners:
         m.status = "Idle"
         m.attempts = 0
-    return jsonify({"status": "reset OK"})
+    session.pow_events.publish("reset", {"height": 0})
+    return jsonify({"status": "reset OK", "seed": session.pow_seed})
 
 # ======================= ROUTES - POS =======================
 
 @app.route("/pos/step", methods=["POST"])
 def pos_step():
-    height = len(pos_chain) + 1
-    blk = create_pos_block(height)
+    session = current_session()
+    with session.pos_lock:
+        height = len(session.pos_chain) + 1
+        blk = create_pos_block(session, height)
 
-    return jsonify({
-        "height": blk.index,
-        "validator": blk.producer,
-        "hash": blk.hash,
-        "timestamp": blk.timestamp
-    })
+    return jsonify(pos_block_json(blk))
 
 @app.route("/pos/status")
 def pos_status():
-    total = sum(v.selected for v in validators)
+    session = current_session()
+    if shared_follower and session is default_session:
+        view, meta = shared_view("pos")
+        version = (view.shared.generation, len(view), counter_epoch())
+
+        def build():
+            page, cursor = chain_page(view, oldest=view.oldest)
+            return {
+                **cursor,
+                "validators": meta.get("validators", [])
+            }, page
+    else:
+        # The tip hash changes with every block and on reset.
+        version = (session.pos_prev_hash, len(session.pos_chain), Validator.stake_version)
+
+        def build():
+            page, cursor = chain_page(session.pos_chain)
+            # Every slot selects exactly one validator, so the selection
+            # total is the chain height; `selected` itself is counted as
+            # blocks are created.
+            return {
+                **cursor,
+                "validators": validators_json(session, cursor["height"])
+            }, page
+    return cached_status(session, version, build)
+
+def pos_stream_source():
+    session = current_session()
+    if shared_follower and session is default_session:
+        height = len(shared_view("pos")[0])
+    else:
+        height = len(session.pos_chain)
+    return session.pos_events, {"height": height}
 
-    return jsonify({
-        "validators": [
-            {
-                "name": v.name,
-                "stake": v.stake,
-                "selected": v.selected,
-                "percentage": round((v.selected / total) * 100, 2) if total > 0 else 0
-            }
-            for v in validators
-        ],
-        "blockchain": [
-            {
-                "height": b.index,
-                "validator": b.producer,
-                "hash": b.hash,
-                "timestamp": b.timestamp
-            }
-            for b in pos_chain
-        ]
-    })
+@app.route("/pos/stream")
+def pos_stream():
+    # Push: "blocks" (new slots + validator stats), "reset" and "closed".
+    return event_stream(*pos_stream_source())
+
+@app.route("/pos/export", methods=["POST"])
+def pos_export():
+    session = current_session()
+    return jsonify(export_chain(export_name("pos", session), session.pos_chain))
 
 @app.route("/pos/auto", methods=["POST"])
 def pos_auto_run():
     slots = int(request.json.get("slots", 10))
-
-    for _ in range(slots):
-        height = len(pos_chain) + 1
-        create_pos_block(height)
+    create_pos_blocks(current_session(), slots)
 
     return jsonify({"status": "auto completed", "slots": slots})
 
 @app.route("/pos/auto100", methods=["POST"])
 def pos_auto_100():
-    for _ in range(100):
-        height = len(pos_chain) + 1
-        create_pos_block(height)
+    create_pos_blocks(current_session(), 100)
 
     return jsonify({"status": "auto completed", "slots": 100})
 
+@app.route("/pos/bulk", methods=["POST"])
+def pos_bulk_start():
+    data = request.get_json(silent=True) or {}
+    try:
+        slots = int(data.get("slots", 0))
+        batch_size = int(data.get("batch", POS_JOB_BATCH))
+    except (TypeError, ValueError):
+        slots = batch_size = 0
+    if slots <= 0 or batch_size <= 0:
+        return jsonify({"error": "slots and batch must be positive integers"}), 400
+
+    job = start_pos_job(current_session(), slots, batch_size)
+    return jsonify(job.to_dict()), 202
+
+@app.route("/pos/bulk")
+def pos_bulk_list():
+    return jsonify({"jobs": [j.to_dict() for j in list(current_session().pos_jobs.values())]})
+
+@app.route("/pos/bulk/<job_id>")
+def pos_bulk_status(job_id):
+    job = current_session().pos_jobs.get(job_id)
+    if job is None:
+        return jsonify({"error": "unknown job"}), 404
+    return jsonify(job.to_dict())
+
+@app.route("/pos/bulk/<job_id>/cancel", methods=["POST"])
+def pos_bulk_cancel(job_id):
+    job = current_session().pos_jobs.get(job_id)
+    if job is None:
+        return jsonify({"error": "unknown job"}), 404
+    job.cancel()
+    return jsonify(job.to_dict())
+
 @app.route("/pos/reset")
 def pos_reset():
-    global pos_chain, pos_prev_hash
-    pos_chain = []
-    pos_prev_hash = "0" * 64
-
-    for v in validators:
-        v.selected = 0
-
-    return jsonify({"status": "reset OK"})
+    session = current_session()
+    try:
+        seed = request_seed(request.args)
+    except ValueError:
+        return jsonify({"error": "seed must be an integer"}), 400
+    for job in list(session.pos_jobs.values()):
+        job.cancel()
+
+    with session.pos_lock:
+        session.pos_chain = reset_chain("pos", session.pos_chain)
+        session.pos_prev_hash = session.pos_chain.last_hash
+        session.pos_seed = seed
+        session.pos_sampler.rng = make_rng(seed, "pos")
+
+        for v in session.validators:
+            v.selected = 0
+
+    session.pos_events.publish("reset", {"height": 0})
+    return jsonify({"status": "reset OK", "seed": session.pos_seed})
 
 # ======================= ROUTES - FORK =======================
 
 @app.route("/fork_pow/simulate", methods=["POST"])
 def fork_simulate():
-    result = simulate_fork()
+    data = request.get_json(silent=True) or {}
+    try:
+        branches = int(data.get("branches", 2))
+        depth = int(data.get("depth", 1))
+    except (TypeError, ValueError):
+        branches = depth = -1
+    if not 2 <= branches <= FORK_MAX_BRANCHES or not 0 <= depth <= FORK_MAX_DEPTH:
+        return jsonify({
+            "error": f"branches must be 2..{FORK_MAX_BRANCHES}, depth 0..{FORK_MAX_DEPTH}"
+        }), 400
+    try:
+        seed = request_seed(data)
+    except (TypeError, ValueError):
+        return jsonify({"error": "seed must be an integer"}), 400
+    rng = make_rng(seed, "fork_pow")
+    session = current_session()
+
+    network = data.get("network")
+    if network is not None and not isinstance(network, dict):
+        network = {}
+    with fork_sim_time.labels("pow").timer():
+        try:
+            result = offload_if(
+                network is not None or depth >= FORK_OFFLOAD_DEPTH,
+                simulate_fork, fork_nodes, branches, depth, network, rng
+            )
+        except (TypeError, ValueError, KeyError) as e:
+            return jsonify({"error": f"invalid network: {e}"}), 400
+    session.node_tip, session.canonical_chain = result["nodes"], result["canonical_chain"]
+    result["seed"] = seed
+    return jsonify(result)
+
+def fork_monte_carlo(mode):
+    # Body: {"trials", "nodes", "branches", "depth", "latency": {"dist", ...},
+    #        "block_interval" (PoW), "stakes" (PoS), "seed", "workers",
+    #        "backend": "python" | "numpy"}
+    data = request.get_json(silent=True) or {}
+    try:
+        trials = int(data.get("trials", 10000))
+        nodes = int(data.get("nodes", len(fork_nodes)))
+        branches = int(data.get("branches", 2))
+        depth = int(data.get("depth", 1))
+        seed = request_seed(data)
+        workers = int(data["workers"]) if "workers" in data else None
+        stakes = [float(x) for x in data["stakes"]] if data.get("stakes") else None
+        block_interval = float(data["block_interval"]) if data.get("block_interval") else None
+    except (TypeError, ValueError, KeyError):
+        return jsonify({"error": "numeric parameters expected"}), 400
+
+    if not (1 <= trials <= FORK_MC_MAX_TRIALS and 1 <= nodes <= FORK_MC_MAX_NODES
+            and 2 <= branches <= FORK_MAX_BRANCHES and 0 <= depth <= FORK_MAX_DEPTH
+            and (block_interval is None or block_interval > 0)):
+        return jsonify({"error": "parameter out of range"}), 400
+
+    try:
+        with offloader.slot(), fork_sim_time.labels(f"{mode}_montecarlo").timer():
+            result = run_monte_carlo(
+                mode, trials=trials, nodes=nodes, branches=branches, depth=depth,
+                latency=data.get("latency"), stakes=stakes, seed=seed, workers=workers,
+                block_interval=block_interval, backend=data.get("backend", "python")
+            )
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify(result)
+
+@app.route("/fork_pow/montecarlo", methods=["POST"])
+def fork_montecarlo():
+    return fork_monte_carlo("pow")
+
+@app.route("/fork_pow/network", methods=["POST"])
+def fork_network_race():
+    # PoW mining race over a simulated peer graph; forks and orphans come
+    # from block propagation. Body: network spec (see sim_tasks.build_network) plus
+    # {"blocks", "block_interval", "block_size", "validation", "hash_power"}.
+    data = request.get_json(silent=True) or {}
+    try:
+        seed = request_seed(data)
+        blocks = int(data.get("blocks", 100))
+        block_interval = float(data.get("block_interval", target_time))
+        block_size = int(data.get("block_size", 1_000_000))
+        validation = float(data.get("validation", 0.01))
+        hash_power = [float(x) for x in data["hash_power"]] if data.get("hash_power") else None
+    except (TypeError, ValueError, KeyError) as e:
+        return jsonify({"error": str(e)}), 400
+
+    if not (1 <= blocks <= NETSIM_MAX_BLOCKS and block_interval > 0 and block_size > 0 and validation >= 0):
+        return jsonify({"error": "parameter out of range"}), 400
+
+    try:
+        with fork_sim_time.labels("pow_network").timer():
+            result = offloader.run(
+                network_race, data, seed, blocks, block_interval, block_size, validation, hash_power
+            )
+    except (TypeError, ValueError, KeyError) as e:
+        return jsonify({"error": str(e)}), 400
+    result["seed"] = seed
     return jsonify(result)
 
 @app.route("/fork_pow/reset")
 def fork_reset():
-    global fork_blocks, node_tip, canonical_chain
-    fork_blocks = {}
-    node_tip = {}
-    canonical_chain = []
+    session = current_session()
+    session.node_tip = {}
+    session.canonical_chain = []
     return jsonify({"status": "reset OK"})
 
 # ======================= ROUTES - FORK POS =======================
 
 @app.route("/fork_pos/simulate", methods=["POST"])
 def fork_pos_simulate():
-    result = run_pos_fork_sim()
+    data = request.get_json(silent=True) or {}
+    try:
+        seed = request_seed(data)
+    except (TypeError, ValueError):
+        return jsonify({"error": "seed must be an integer"}), 400
+    with fork_sim_time.labels("pos").timer():
+        result = run_pos_fork_sim(current_session(), make_rng(seed, "fork_pos"))
+    result["seed"] = seed
     return jsonify(result)
 
+@app.route("/fork_pos/montecarlo", methods=["POST"])
+def fork_pos_montecarlo():
+    return fork_monte_carlo("pos")
+
 @app.route("/fork_pos/reset")
 def fork_pos_reset():
-    global fork_pos_blocks, fork_validators
-    fork_pos_blocks = {}
-    fork_validators = []
+    session = current_session()
+    session.fork_pos_blocks = BlockTree("GEN")
+    session.fork_validators = []
     return jsonify({"status": "reset OK"})
 
+# ======================= ROUTES - METRICS =======================
+
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+
+@app.after_request
+def record_request_time(response):
+    started = g.pop("request_started", None)
+    if started is not None:
+        route = request.url_rule.rule if request.url_rule else "unmatched"
+        http_request_time.labels(request.method, route, response.status_code).observe(
+            time.perf_counter() - started
+        )
+    return response
+
+@app.route("/metrics")
+def metrics():
+    return Response(REGISTRY.render(), content_type=CONTENT_TYPE)
+
+# ======================= RESTORE =======================
+
+def restore_state(session):
+    # Chains reopened from CHAIN_DATA_DIR: pick up where the last run stopped.
+    # Both chains stay lazily mapped: PoW reads its last rows, PoS scans only
+    # its producer field.
+    session.pow_sim.restore()
+
+    if len(session.pos_chain):
+        session.pos_prev_hash = session.pos_chain.last_hash
+        counts = session.pos_chain.producer_counts()
+        for v in session.validators:
+            v.selected = counts.get(v.name, 0)
+
+restore_state(default_session)
+
+# ======================= SHARED CHAIN - WORKERS =======================
+# The primary mirrors both default chains into shared memory
+# (shared_chain.py), publishes difficulty, miner counters and validator
+# stats next to them every SHARED_META_INTERVAL and answers the requests
+# followers forward. Followers serve the default session's status calls and
+# streams from shared memory, so they may lag the primary by one interval,
+# and forward every other default-session route that reads or changes the
+# simulation. Other sessions live in the worker that created them: route
+# them to it (sticky sessions on the sim_session cookie).
+
+SHARED_META_INTERVAL = 0.25
+SHARED_FORWARDED = frozenset({
+    "pow_start", "pow_simulate", "pow_retarget_route", "pow_stop", "pow_export", "pow_reset",
+    "pos_step", "pos_export", "pos_auto_run", "pos_auto_100", "pos_bulk_start", "pos_bulk_list",
+    "pos_bulk_status", "pos_bulk_cancel", "pos_reset", "session_info",
+})
+SHARED_STORES = {"pow": PowChainStore, "pos": PosChainStore}
+shared_chains = {}  # "pow" / "pos" -> SharedChain
+
+def shared_view(kind):
+    # Follower: (SharedChainView, meta) of the primary's chain, attached on
+    # first use.
+    shared = shared_chains.get(kind)
+    if shared is None:
+        try:
+            shared = SharedChain.attach(f"{SHARED_CHAIN}-{kind}")
+        except FileNotFoundError:
+            raise SharedChainError("the primary worker is not ready") from None
+        shared_chains[kind] = shared
+    return SharedChainView(shared, SHARED_STORES[kind]), shared.meta()
+
+def primary_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+@app.errorhandler(SharedChainError)
+def shared_chain_unavailable(e):
+    return jsonify({"error": str(e)}), 503
+
+@app.before_request
+def forward_to_primary():
+    if not shared_follower or request.endpoint not in SHARED_FORWARDED:
+        return None
+    if current_session() is not default_session:
+        return None
+    message = (request.method, request.path, request.query_string.decode(),
+               request.get_data(), request.content_type)
+    try:
+        status, content_type, body = coordinator.call(message)
+    except (OSError, EOFError):
+        return jsonify({"error": "the primary worker is not reachable"}), 503
+    return Response(body, status, content_type=content_type)
+
+def run_forwarded(message):
+    # Primary: a follower's request, through the full Flask stack.
+    method, path, query_string, body, content_type = message
+    response = app.test_client().open(
+        path, method=method, query_string=query_string, data=body, content_type=content_type
+    )
+    return response.status_code, response.content_type, response.get_data()
+
+def publish_shared_meta():
+    pid = os.getpid()
+    while True:
+        snap = default_session.pow_sim.snapshot
+        shared_chains["pow"].set_meta({
+            "pid": pid, "difficulty": snap.difficulty, "miners": miners_json(default_session)
+        })
+        with default_session.pos_lock:
+            total = len(default_session.pos_chain)
+            validators = validators_json(default_session, total)
+        shared_chains["pos"].set_meta({"pid": pid, "validators": validators})
+        time.sleep(SHARED_META_INTERVAL)
+
+def follow_shared_chains():
+    # Follower: turn shared chain growth into /pow/stream and /pos/stream
+    # events of the default session.
+    seen = {}  # kind -> (generation, count, meta)
+    while True:
+        time.sleep(SHARED_META_INTERVAL)
+        for kind, broker in (("pow", default_session.pow_events), ("pos", default_session.pos_events)):
+            try:
+                view, meta = shared_view(kind)
+            except SharedChainError:
+                continue
+            if "pid" in meta and not primary_alive(meta["pid"]):
+                # A restarted primary creates new segments; drop the old one.
+                shared_chains.pop(kind).close()
+                seen.pop(kind, None)
+                continue
+            shared = view.shared
+            generation, count = shared.generation, shared.count
+            last = seen.get(kind)
+            seen[kind] = (generation, count, meta)
+            if last is None or not broker.has_subscribers():
+                continue
+            if generation != last[0]:
+                broker.publish("reset", {"height": count})
+            elif kind == "pow":
+                publish_shared_pow(broker, view, last[1], count, last[2], meta)
+            elif count > last[1]:
+                data = {"height": count, "validators": meta.get("validators", [])}
+                if count - last[1] <= POS_EVENT_MAX_BLOCKS:
+                    data["blocks"] = [pos_block_json(b) for b in view[last[1]:count]]
+                broker.publish("blocks", data)
+
+def publish_shared_pow(broker, view, old_count, count, old_meta, meta):
+    miners = meta.get("miners", [])
+    for b in view[max(old_count, count - POS_EVENT_MAX_BLOCKS):count]:
+        broker.publish("block", {"block": pow_block_json(b), "miners": miners})
+    old, new = old_meta.get("difficulty"), meta.get("difficulty")
+    if old is not None and new is not None and old != new:
+        broker.publish("difficulty", {"old": old, "new": new, "action": change_action(old, new)})
+    if miners != old_meta.get("miners"):
+        broker.publish("miners", {"miners": miners})
+
+@REGISTRY.on_collect
+def collect_shared_gauges():
+    # Runs after collect_chain_gauges: followers report the shared chains.
+    if not shared_follower:
+        return
+    try:
+        pow_view, pow_meta = shared_view("pow")
+        pos_view, _ = shared_view("pos")
+    except SharedChainError:
+        return
+    pow_height_gauge.set(len(pow_view))
+    pow_difficulty_gauge.set(pow_meta.get("difficulty", POW_INITIAL_DIFFICULTY))
+    pos_height_gauge.set(len(pos_view))
+
+@atexit.register
+def close_shared_chains():
+    for shared in shared_chains.values():
+        shared.close()
+    shared_chains.clear()
+
+if coordinator is not None:
+    if coordinator.primary:
+        for kind, store_class in SHARED_STORES.items():
+            shared_chains[kind] = SharedChain.create(
+                f"{SHARED_CHAIN}-{kind}", store_class.record.size, SHARED_CHAIN_CAPACITY
+            )
+        with default_session.pow_sim.lock:
+            default_session.pow_sim.chain.attach_mirror(shared_chains["pow"])
+        with default_session.pos_lock:
+            default_session.pos_chain.attach_mirror(shared_chains["pos"])
+        coordinator.serve(run_forwarded)
+        threading.Thread(target=publish_shared_meta, daemon=True).start()
+    else:
+        threading.Thread(target=follow_shared_chains, daemon=True).start()
+
 # ======================= RUN =======================
 
 if __name__ == "__main__":
@@ -0,0 +1,209 @@
+# ============================================================
+#  asgi.py – Event-loop serving mode (ASGI) for app.py
+# ============================================================
+#
+#   pip install uvicorn
+#   uvicorn asgi:application --host 127.0.0.1 --port 8888
+#
+# The event loop owns the connections. /pow/stream and /pos/stream are
+# relayed from the EventBroker without holding a thread once they are open.
+# Every request, including the stream's session lookup, runs the Flask app
+# on a pool of ASGI_THREADS threads, since any of them may block: a session
+# lookup can close an expired session (joining its mining thread) and the
+# first read of a restored chain unpacks its log. Once ASGI_MAX_QUEUED more
+# are waiting, new ones get a 503 with Retry-After. CPU-heavy simulations
+# continue from those threads to the process pool of offload.py.
+#
+# Run a single server process; see SHARED_CHAIN in app.py for several.
+
+import asyncio
+import io
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+from werkzeug.exceptions import HTTPException
+
+import app as simulator
+from events import KEEPALIVE_SECONDS, hello_event
+from sessions import SessionError
+from shared_chain import SharedChainError
+
+flask_app = simulator.app
+
+ASGI_THREADS = int(os.environ.get("ASGI_THREADS", 32))
+ASGI_MAX_QUEUED = int(os.environ.get("ASGI_MAX_QUEUED", 64))
+STREAM_SOURCES = {
+    "pow_stream": simulator.pow_stream_source,
+    "pos_stream": simulator.pos_stream_source,
+}
+STREAM_HEADERS = [
+    (b"content-type", b"text/event-stream; charset=utf-8"),
+    (b"cache-control", b"no-cache"),
+    (b"x-accel-buffering", b"no"),
+]
+
+executor = ThreadPoolExecutor(ASGI_THREADS, thread_name_prefix="asgi")
+in_flight = 0  # requests on the executor, running or queued; loop thread only
+
+
+# ======================= WSGI BRIDGE =======================
+
+def wsgi_environ(scope, body):
+    server = scope.get("server") or ("localhost", 80)
+    client = scope.get("client") or ("", 0)
+    environ = {
+        "REQUEST_METHOD": scope["method"],
+        "SCRIPT_NAME": scope.get("root_path", "").encode().decode("latin1"),
+        "PATH_INFO": scope["path"].encode().decode("latin1"),
+        "QUERY_STRING": scope["query_string"].decode("latin1"),
+        "SERVER_NAME": server[0],
+        "SERVER_PORT": str(server[1]),
+        "SERVER_PROTOCOL": f"HTTP/{scope.get('http_version', '1.1')}",
+        "REMOTE_ADDR": client[0],
+        "CONTENT_LENGTH": str(len(body)),
+        "wsgi.version": (1, 0),
+        "wsgi.url_scheme": scope.get("scheme", "http"),
+        "wsgi.input": io.BytesIO(body),
+        "wsgi.errors": sys.stderr,
+        "wsgi.multithread": True,
+        "wsgi.multiprocess": False,
+        "wsgi.run_once": False,
+    }
+    for name, value in scope["headers"]:
+        key = name.decode("latin1").upper().replace("-", "_")
+        value = value.decode("latin1")
+        if key not in ("CONTENT_TYPE", "CONTENT_LENGTH"):
+            key = "HTTP_" + key
+        environ[key] = f"{environ[key]},{value}" if key.startswith("HTTP_") and key in environ else value
+    return environ
+
+
+def call_wsgi(environ):
+    # The whole Flask response: (status, [(name, value)], body bytes).
+    started = []
+    chunks = []
+
+    def start_response(status, headers, exc_info=None):
+        started[:] = [int(status.split(" ", 1)[0]), headers]
+        return chunks.append
+
+    result = flask_app(environ, start_response)
+    try:
+        chunks.extend(result)
+    finally:
+        if hasattr(result, "close"):
+            result.close()
+    status, headers = started
+    return status, [(k.lower().encode("latin1"), v.encode("latin1")) for k, v in headers], b"".join(chunks)
+
+
+async def send_response(send, status, headers, body):
+    await send({"type": "http.response.start", "status": status, "headers": headers})
+    await send({"type": "http.response.body", "body": body})
+
+
+async def read_body(receive):
+    body = []
+    while True:
+        message = await receive()
+        if message["type"] == "http.disconnect":
+            return None
+        body.append(message.get("body", b""))
+        if not message.get("more_body"):
+            return b"".join(body)
+
+
+# ======================= STREAMS =======================
+
+def stream_source(endpoint, environ):
+    # (broker, hello), or None to let Flask answer with its error page
+    # (unknown session, shared chain unavailable). Anything else propagates
+    # rather than tying up a thread for the life of a WSGI stream.
+    with flask_app.request_context(environ):
+        try:
+            return STREAM_SOURCES[endpoint]()
+        except (SessionError, SharedChainError):
+            return None
+
+
+async def relay_stream(receive, send, broker, hello):
+    loop = asyncio.get_running_loop()
+    sub = broker.subscribe(loop)
+    disconnected = asyncio.ensure_future(receive())
+    try:
+        await send({"type": "http.response.start", "status": 200, "headers": STREAM_HEADERS})
+        message = hello_event(hello)
+        while message is not None:
+            await send({"type": "http.response.body", "body": message.encode(), "more_body": True})
+            get = asyncio.ensure_future(sub.queue.get())
+            done, _ = await asyncio.wait(
+                {get, disconnected}, timeout=KEEPALIVE_SECONDS, return_when=asyncio.FIRST_COMPLETED
+            )
+            if disconnected in done:
+                get.cancel()
+                return
+            if get in done:
+                message = get.result()  # None: dropped as too slow
+            else:
+                get.cancel()
+                message = ": keepalive\n\n"
+        await send({"type": "http.response.body", "body": b""})
+    finally:
+        disconnected.cancel()
+        broker.unsubscribe(sub)
+
+
+# ======================= APPLICATION =======================
+
+def match_endpoint(environ):
+    try:
+        endpoint, _ = flask_app.url_map.bind_to_environ(environ).match()
+    except HTTPException:
+        return None
+    return endpoint
+
+
+async def lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message["type"] == "lifespan.startup":
+            await send({"type": "lifespan.startup.complete"})
+        elif message["type"] == "lifespan.shutdown":
+            executor.shutdown(wait=False, cancel_futures=True)
+            await send({"type": "lifespan.shutdown.complete"})
+            return
+
+
+async def application(scope, receive, send):
+    global in_flight
+    if scope["type"] == "lifespan":
+        return await lifespan(receive, send)
+    if scope["type"] != "http":
+        return
+
+    body = await read_body(receive)
+    if body is None:
+        return
+    environ = wsgi_environ(scope, body)
+    endpoint = match_endpoint(environ)
+
+    if in_flight >= ASGI_THREADS + ASGI_MAX_QUEUED:
+        return await send_response(send, 503, [
+            (b"content-type", b"application/json"),
+            (b"retry-after", str(simulator.SIM_RETRY_AFTER).encode()),
+        ], b'{"error":"server busy, retry later"}\n')
+    loop = asyncio.get_running_loop()
+    in_flight += 1
+    try:
+        if endpoint in STREAM_SOURCES and scope["method"] == "GET":
+            source = await loop.run_in_executor(executor, stream_source, endpoint, environ)
+        else:
+            source = None
+        if source is None:
+            response = await loop.run_in_executor(executor, call_wsgi, environ)
+    finally:
+        in_flight -= 1
+    if source is not None:
+        return await relay_stream(receive, send, *source)
+    await send_response(send, *response)
@@ -0,0 +1,304 @@
+# ============================================================
+#  run_benchmarks.py – Hot-path benchmarks with baseline check
+# ============================================================
+#
+#   python benchmarks/run_benchmarks.py                  # run, compare to baseline
+#   python benchmarks/run_benchmarks.py --quick          # shorter runs
+#   python benchmarks/run_benchmarks.py --save-baseline  # accept current numbers
+#   python benchmarks/run_benchmarks.py --only pos,http  # some groups only
+#
+# Results are written as JSON (--output). Each metric records whether higher
+# or lower is better; a metric more than --tolerance worse than the baseline
+# is a regression and makes the exit status 1.
+
+import argparse
+import json
+import os
+import platform
+import queue
+import random
+import statistics
+import sys
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "simple_simulator"))
+
+# Benchmarks run on in-memory chains with a fixed seed.
+os.environ.pop("CHAIN_DATA_DIR", None)
+os.environ.setdefault("SIM_SEED", "1")
+
+import app  # noqa: E402
+import pow_fork_simulator  # noqa: E402
+import pow_simulator  # noqa: E402
+from block_tree import BlockTree  # noqa: E402
+
+BASELINE_PATH = os.path.join(ROOT, "benchmarks", "baseline.json")
+OUTPUT_PATH = os.path.join(ROOT, "benchmarks", "results.json")
+GROUPS = ("hashing", "pos", "fork", "http")
+
+
+def metric(value, unit, better="higher"):
+    return {"value": round(value, 3), "unit": unit, "better": better}
+
+
+def timed_loop(fn, duration):
+    # Calls fn() until `duration` seconds pass; fn returns work units done.
+    done = 0
+    start = time.perf_counter()
+    while True:
+        done += fn()
+        elapsed = time.perf_counter() - start
+        if elapsed >= duration:
+            return done / elapsed
+
+
+# ======================= HASHING =======================
+
+def bench_mine_worker(difficulty, duration):
+    # One app.mine_worker thread, fed blocks back to back.
+    miner = app.Miner("Bench", 1.0)
+    work, done = queue.Queue(), queue.Queue()
+    threading.Thread(target=app.mine_worker, args=(miner, work, done), daemon=True).start()
+    rng = random.Random(1)
+    height = [0]
+
+    def one_block():
+        height[0] += 1
+        stop = threading.Event()
+        timer = threading.Timer(duration, stop.set)
+        timer.start()
+        work.put((stop, {}, f"{height[0]:064x}", difficulty, 0, rng))
+        done.get()
+        timer.cancel()
+        return miner.attempts
+
+    return timed_loop(one_block, duration)
+
+
+def bench_mine_block_pow(difficulty, duration):
+    miners = [pow_simulator.Miner("A", 1.0), pow_simulator.Miner("B", 1.5)]
+    rng = random.Random(1)
+    height = [0]
+
+    def one_block():
+        height[0] += 1
+        _, _, attempts = pow_simulator.mine_block_pow(miners, f"{height[0]:064x}", difficulty, rng=rng)
+        return attempts
+
+    return timed_loop(one_block, duration)
+
+
+def run_hashing(quick):
+    duration = 0.5 if quick else 2.0
+    results = {}
+    for d in (2, 3, 4):
+        results[f"hashing.mine_worker.d{d}"] = metric(bench_mine_worker(d, duration), "hashes/s")
+        results[f"hashing.mine_block_pow.d{d}"] = metric(bench_mine_block_pow(d, duration), "hashes/s")
+    return results
+
+
+# ======================= POS =======================
+
+def run_pos(quick):
+    duration = 0.3 if quick else 1.0
+    results = {}
+    for n in (3, 100, 1000, 10000):
+        # A private in-memory session with `n` validators.
+        session = app.Session(f"bench-v{n}", 1)
+        session.validators = [app.Validator(f"V{i}", 1 + i % 50) for i in range(n)]
+        session.pos_sampler = app.StakeSampler(session.validators, random.Random(1))
+
+        rate = timed_loop(lambda: len([app.select_validator(session) for _ in range(1000)]), duration)
+        results[f"pos.select_validator.v{n}"] = metric(rate, "slots/s")
+
+        def create_batch():
+            for _ in range(1000):
+                app.create_pos_block(session, len(session.pos_chain) + 1)
+            return 1000
+        results[f"pos.create_pos_block.v{n}"] = metric(timed_loop(create_batch, duration), "slots/s")
+
+        rate = timed_loop(lambda: len(app.create_pos_blocks(session, 10000)), duration)
+        results[f"pos.create_pos_blocks.v{n}"] = metric(rate, "slots/s")
+    return results
+
+
+# ======================= FORK =======================
+
+def run_fork(quick):
+    duration = 0.3 if quick else 1.0
+    results = {}
+    for depth in (1000, 10000, 100000):
+        blocks = {}
+        tree = BlockTree("GEN")
+        pow_fork_simulator.add_block(blocks, "GEN", None)
+        parent = "GEN"
+        for i in range(depth):
+            pow_fork_simulator.add_block(blocks, i, parent)
+            tree.add(i, parent)
+            parent = i
+        tip = depth - 1
+
+        rate = timed_loop(lambda: len([pow_fork_simulator.compute_chain_length(blocks, tip)
+                                       for _ in range(1000)]), duration)
+        results[f"fork.compute_chain_length.depth{depth}"] = metric(rate, "calls/s")
+        rate = timed_loop(lambda: len(pow_fork_simulator.get_chain_path(blocks, tip)), duration)
+        results[f"fork.get_chain_path.depth{depth}"] = metric(rate, "blocks/s")
+        rate = timed_loop(lambda: len(tree.path(tip)), duration)
+        results[f"fork.block_tree_path.depth{depth}"] = metric(rate, "blocks/s")
+        rate = timed_loop(lambda: len([tree[tip].ancestor(depth // 3) for _ in range(100)]), duration)
+        results[f"fork.block_tree_ancestor.depth{depth}"] = metric(rate, "calls/s")
+    return results
+
+
+# ======================= HTTP =======================
+
+HTTP_ENDPOINTS = (
+    ("pow_status", "GET", "/pow/status?since_height=0", None),
+    ("pos_status", "GET", "/pos/status?since_height=0", None),
+    ("fork_pow_simulate", "POST", "/fork_pow/simulate", {"branches": 2, "depth": 1, "seed": 1}),
+    ("fork_pos_simulate", "POST", "/fork_pos/simulate", {"seed": 1}),
+)
+
+
+def bench_endpoint(method, url, body, clients, duration):
+    # `clients` threads, one Flask test client each, hammering one endpoint.
+    latencies = []
+    errors = []
+    deadline = time.perf_counter() + duration
+
+    def client():
+        c = app.app.test_client()
+        local, failed = [], 0
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            r = c.open(url, method=method, json=body)
+            local.append(time.perf_counter() - start)
+            failed += r.status_code >= 400
+        latencies.extend(local)
+        errors.append(failed)
+
+    threads = [threading.Thread(target=client) for _ in range(clients)]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    p95 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+    return len(latencies) / elapsed, statistics.median(latencies), p95, sum(errors)
+
+
+def run_http(quick):
+    duration = 1.0 if quick else 3.0
+    client = app.app.test_client()
+    client.get("/pow/reset?seed=1")
+    client.get("/pos/reset?seed=1")
+    client.post("/pow/simulate", json={"blocks": 5000})
+    for _ in range(50):
+        client.post("/pos/auto100")
+
+    results = {}
+    for clients in (1, 8):
+        for name, method, url, body in HTTP_ENDPOINTS:
+            rps, p50, p95, errors = bench_endpoint(method, url, body, clients, duration)
+            key = f"http.{name}.c{clients}"
+            results[key + ".throughput"] = metric(rps, "req/s")
+            results[key + ".p50"] = metric(p50 * 1000, "ms", "lower")
+            results[key + ".p95"] = metric(p95 * 1000, "ms", "lower")
+            if errors:
+                results[key + ".errors"] = metric(errors, "responses", "lower")
+    return results
+
+
+# ======================= REPORT =======================
+
+RUNNERS = {"hashing": run_hashing, "pos": run_pos, "fork": run_fork, "http": run_http}
+
+
+def compare(results, baseline, tolerance):
+    # -> list of (name, current, baseline, change, regressed)
+    rows = []
+    for name, cur in sorted(results.items()):
+        base = baseline.get(name)
+        if base is None or not base["value"]:
+            rows.append((name, cur, None, None, False))
+            continue
+        change = cur["value"] / base["value"] - 1
+        worse = -change if cur["better"] == "higher" else change
+        rows.append((name, cur, base, change, worse > tolerance))
+    return rows
+
+
+def print_report(rows):
+    for name, cur, base, change, regressed in rows:
+        line = f"{name:<45} {cur['value']:>14,.1f} {cur['unit']:<10}"
+        if base is not None:
+            line += f" baseline {base['value']:>14,.1f}  {change:+7.1%}"
+            if regressed:
+                line += "  REGRESSION"
+        print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the simulator hot paths.")
+    parser.add_argument("--only", help=f"comma-separated groups ({', '.join(GROUPS)})")
+    parser.add_argument("--quick", action="store_true", help="shorter measurements")
+    parser.add_argument("--output", default=OUTPUT_PATH, help="where to write the JSON results")
+    parser.add_argument("--baseline", default=BASELINE_PATH, help="baseline JSON to compare with")
+    parser.add_argument("--tolerance", type=float, default=0.25,
+                        help="allowed relative slowdown before a metric counts as a regression")
+    parser.add_argument("--save-baseline", action="store_true", help="store these results as the baseline")
+    args = parser.parse_args()
+
+    groups = args.only.split(",") if args.only else list(GROUPS)
+    unknown = set(groups) - set(GROUPS)
+    if unknown:
+        parser.error(f"unknown group(s): {', '.join(sorted(unknown))}")
+
+    results = {}
+    for group in groups:
+        print(f"# {group}", file=sys.stderr)
+        results.update(RUNNERS[group](args.quick))
+
+    report = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "quick": args.quick,
+        },
+        "results": results,
+    }
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2, sort_keys=True)
+
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f)["results"]
+
+    rows = compare(results, baseline, args.tolerance)
+    print_report(rows)
+
+    if args.save_baseline:
+        merged = dict(baseline, **results)
+        with open(args.baseline, "w") as f:
+            json.dump(dict(report, results=merged), f, indent=2, sort_keys=True)
+        print(f"baseline saved to {args.baseline}", file=sys.stderr)
+        return 0
+
+    regressions = [r[0] for r in rows if r[4]]
+    if regressions:
+        print(f"{len(regressions)} regression(s) beyond {args.tolerance:.0%}", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,64 @@
+# ============================================================
+#  block_json.py – Blocks encoded to JSON once
+# ============================================================
+#
+# Blocks never change after they are appended, so a chain store keeps each
+# block's JSON encoding (a "fragment") next to its row. Status responses are
+# built by joining fragments instead of turning every block of the page into
+# a dict and encoding it again on every poll.
+#
+# orjson is used when it is installed; the output is the same JSON either way
+# (compact, no trailing newline).
+
+import json
+
+try:
+    import orjson
+except ImportError:  # optional: the json module is a few times slower
+    orjson = None
+
+_encoder = json.JSONEncoder(separators=(",", ":"))
+
+
+def dumps(data):
+    # -> bytes
+    if orjson is not None:
+        return orjson.dumps(data)
+    return _encoder.encode(data).encode()
+
+
+def pow_block_json(b):
+    return {
+        "height": b.index,
+        "miner": b.producer,
+        "difficulty": b.difficulty,
+        "nonce": b.nonce,
+        "attempts": b.attempts,
+        "time": round(b.elapsed, 3),
+        "hash": b.hash,
+        "timestamp": b.timestamp
+    }
+
+
+def pos_block_json(b):
+    return {
+        "height": b.index,
+        "validator": b.producer,
+        "hash": b.hash,
+        "timestamp": b.timestamp
+    }
+
+
+def pow_block_fragment(b):
+    return dumps(pow_block_json(b))
+
+
+def pos_block_fragment(b):
+    return dumps(pos_block_json(b))
+
+
+def dumps_with_fragments(data, key, fragments):
+    # dumps(data) plus data[key] = the JSON array of `fragments`.
+    head = dumps(data)
+    sep = b"," if len(head) > 2 else b""
+    return b"".join((head[:-1], sep, dumps(key), b":[", b",".join(fragments), b"]}"))
@@ -0,0 +1,131 @@
+# ============================================================
+#  block_tree.py – Block tree for fork simulations
+# ============================================================
+#
+# Every block stores its height and cumulative work when it is inserted, and
+# the tree keeps its leaf tips and best tips up to date, so chain length and
+# best-tip queries are O(1). Each node also has one skip pointer (the same
+# scheme as Bitcoin's CBlockIndex::pskip), which makes ancestor lookups
+# O(log n) without per-node jump tables.
+
+
+def _invert_lowest_one(n):
+    return n & (n - 1)
+
+
+def _skip_height(height):
+    if height < 2:
+        return 0
+    if height & 1:
+        return _invert_lowest_one(_invert_lowest_one(height - 1)) + 1
+    return _invert_lowest_one(height)
+
+
+class TreeNode:
+    __slots__ = ("block_id", "parent", "height", "work", "skip")
+
+    def __init__(self, block_id, parent, work):
+        self.block_id = block_id
+        self.parent = parent
+        if parent is None:
+            self.height = 0
+            self.work = work
+            self.skip = None
+        else:
+            self.height = parent.height + 1
+            self.work = parent.work + work
+            self.skip = parent.ancestor(_skip_height(self.height))
+
+    @property
+    def parent_id(self):
+        return self.parent.block_id if self.parent is not None else None
+
+    def ancestor(self, height):
+        if height > self.height or height < 0:
+            return None
+
+        walk = self
+        h = self.height
+        while h > height:
+            h_skip = _skip_height(h)
+            h_skip_prev = _skip_height(h - 1)
+            if walk.skip is not None and (
+                h_skip == height
+                or (h_skip > height and not (h_skip_prev < h_skip - 2 and h_skip_prev >= height))
+            ):
+                walk = walk.skip
+                h = h_skip
+            else:
+                walk = walk.parent
+                h -= 1
+        return walk
+
+    def __repr__(self):
+        return f"{self.block_id}(parent={self.parent_id})"
+
+
+class BlockTree:
+    def __init__(self, genesis_id="GEN", genesis_work=0):
+        genesis = TreeNode(genesis_id, None, genesis_work)
+        self.genesis = genesis
+        self.nodes = {genesis_id: genesis}
+        self.tips = {genesis_id}
+        self.best_tips = {genesis_id}
+        self.best_work = genesis.work
+
+    def __contains__(self, block_id):
+        return block_id in self.nodes
+
+    def __getitem__(self, block_id):
+        return self.nodes[block_id]
+
+    def __len__(self):
+        return len(self.nodes)
+
+    def add(self, block_id, parent_id, work=1):
+        if block_id in self.nodes:
+            raise ValueError(f"duplicate block {block_id}")
+
+        node = TreeNode(block_id, self.nodes[parent_id], work)
+        self.nodes[block_id] = node
+
+        self.tips.discard(parent_id)
+        self.tips.add(block_id)
+        self.best_tips.discard(parent_id)
+        if node.work > self.best_work:
+            self.best_work = node.work
+            self.best_tips = {block_id}
+        elif node.work == self.best_work:
+            self.best_tips.add(block_id)
+
+        return node
+
+    def chain_length(self, tip):
+        # Number of blocks from genesis to `tip`, both included.
+        return self.nodes[tip].height + 1
+
+    def common_ancestor(self, a, b):
+        # Bring both to the same height, then walk them up together: nodes at
+        # equal heights have skip pointers at equal heights, and while those
+        # differ the common ancestor is below them, so both can jump. O(log n).
+        a, b = self.nodes[a], self.nodes[b]
+        if a.height > b.height:
+            a = a.ancestor(b.height)
+        else:
+            b = b.ancestor(a.height)
+        while a is not b:
+            if a.skip is not b.skip:
+                a, b = a.skip, b.skip
+            else:
+                a, b = a.parent, b.parent
+        return a.block_id
+
+    def path(self, tip):
+        # Block ids from genesis to `tip`.
+        path = []
+        node = self.nodes[tip]
+        while node is not None:
+            path.append(node.block_id)
+            node = node.parent
+        path.reverse()
+        return path
@@ -0,0 +1,182 @@
+# ============================================================
+#  chain_log.py – Append-only on-disk block log
+# ============================================================
+#
+# <name>.log       16-byte header, then one fixed-size record per block
+# <name>.producers producer names, one per line; line n is producer id n
+#
+# Records are buffered and written in batches; a background thread flushes
+# them every FLUSH_INTERVAL seconds and fsyncs every FSYNC_INTERVAL seconds.
+# A torn record left by a crash is cut off when the log is reopened.
+
+import mmap
+import os
+import struct
+import threading
+import time
+
+MAGIC = b"CHAINLOG"
+VERSION = 2  # 2: PoW difficulty stored as a double
+HEADER = struct.Struct("<8sHH4x")  # magic, version, record size
+
+FLUSH_RECORDS = 4096
+FLUSH_INTERVAL = 1.0
+FSYNC_INTERVAL = 5.0
+
+
+class ChainLogError(Exception):
+    pass
+
+
+class ChainLogReader:
+    # Read-only memory map over the records of a log file.
+    def __init__(self, path):
+        with open(path, "rb") as f:
+            header = f.read(HEADER.size)
+            magic, version, record_size = HEADER.unpack(header)
+            if magic != MAGIC or version != VERSION:
+                raise ChainLogError(f"{path}: not a chain log (version {VERSION})")
+            self.record_size = record_size
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        self.count = (len(self._mmap) - HEADER.size) // record_size
+        self.records = memoryview(self._mmap)[HEADER.size:HEADER.size + self.count * record_size]
+        self.names = read_names(path)
+
+    def __len__(self):
+        return self.count
+
+    def record(self, fmt, i):
+        if not 0 <= i < self.count:
+            raise IndexError("record index out of range")
+        return fmt.unpack_from(self.records, i * self.record_size)
+
+    def close(self):
+        self.records.release()
+        self._mmap.close()
+
+
+def export_store(store, path):
+    # Write a chain store as a standalone log file (+ .producers), readable
+    # with chain_reader.ChainReader.
+    with open(path, "wb") as f:
+        f.write(HEADER.pack(MAGIC, VERSION, store.record.size))
+        batch = []
+        for record in store.records():
+            batch.append(record)
+            if len(batch) >= FLUSH_RECORDS:
+                f.write(b"".join(batch))
+                batch.clear()
+        f.write(b"".join(batch))
+
+    with open(names_path(path), "w", encoding="utf-8") as f:
+        f.writelines(name + "\n" for name in store.producers)
+
+
+def names_path(path):
+    return os.path.splitext(path)[0] + ".producers"
+
+
+def read_names(path):
+    try:
+        with open(names_path(path), encoding="utf-8") as f:
+            return f.read().splitlines()
+    except FileNotFoundError:
+        return []
+
+
+class ChainLog:
+    def __init__(self, path, record_size):
+        self.path = path
+        self.record_size = record_size
+        self._lock = threading.Lock()
+        self._buffer = []
+        self._dirty = False
+        self._last_fsync = time.time()
+        self._closed = False
+
+        self._file = open(path, "a+b")
+        self._names = open(names_path(path), "a", encoding="utf-8")
+        self._check_header()
+
+        threading.Thread(target=self._flush_loop, daemon=True).start()
+
+    def _check_header(self):
+        self._file.seek(0, os.SEEK_END)
+        size = self._file.tell()
+
+        if size == 0:
+            self._file.write(HEADER.pack(MAGIC, VERSION, self.record_size))
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self.count = 0
+            return
+
+        self._file.seek(0)
+        magic, version, record_size = HEADER.unpack(self._file.read(HEADER.size))
+        if magic != MAGIC or version != VERSION or record_size != self.record_size:
+            raise ChainLogError(f"{self.path}: incompatible chain log")
+
+        self.count = (size - HEADER.size) // record_size
+        whole = HEADER.size + self.count * record_size
+        if whole != size:
+            self._file.truncate(whole)
+
+    def __len__(self):
+        return self.count + len(self._buffer)
+
+    def reader(self):
+        self.flush()
+        return ChainLogReader(self.path)
+
+    def add_name(self, name):
+        # Names are made durable right away: records written later refer to them.
+        with self._lock:
+            self._names.write(name + "\n")
+            self._names.flush()
+            os.fsync(self._names.fileno())
+
+    def append(self, record):
+        with self._lock:
+            self._buffer.append(record)
+            if len(self._buffer) >= FLUSH_RECORDS:
+                self._write_locked()
+
+    def _write_locked(self):
+        if self._buffer:
+            self._file.write(b"".join(self._buffer))
+            self.count += len(self._buffer)
+            self._buffer.clear()
+            self._file.flush()
+            self._dirty = True
+
+    def flush(self, fsync=False):
+        with self._lock:
+            self._write_locked()
+            if fsync and self._dirty:
+                os.fsync(self._file.fileno())
+                self._dirty = False
+                self._last_fsync = time.time()
+
+    def _flush_loop(self):
+        while not self._closed:
+            time.sleep(FLUSH_INTERVAL)
+            if self._closed:
+                break
+            self.flush(fsync=time.time() - self._last_fsync >= FSYNC_INTERVAL)
+
+    def truncate(self):
+        with self._lock:
+            self._buffer.clear()
+            self._file.truncate(HEADER.size)
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self._names.truncate(0)
+            self._names.flush()
+            self.count = 0
+
+    def close(self):
+        self.flush(fsync=True)
+        self._closed = True
+        self._file.close()
+        self._names.close()
@@ -0,0 +1,118 @@
+# ============================================================
+#  chain_reader.py – Memory-mapped chain reader for analytics
+# ============================================================
+#
+# Opens a chain log (CHAIN_DATA_DIR/*.log or a /pow/export, /pos/export file)
+# without loading it: blocks are read straight from the memory map by height,
+# and whole columns are scanned with struct.iter_unpack.
+#
+#   python chain_reader.py data/pos.log
+
+import re
+import struct
+import sys
+from collections import Counter
+from operator import itemgetter
+
+from chain_log import ChainLogReader
+from chain_store import PosChainStore, PowChainStore
+
+
+def field_layout(store_class):
+    # field name -> (offset, struct) inside one record
+    layout = {}
+    offset = 0
+    for name, code in zip(store_class.fields, re.findall(r"\d*[a-zA-Z?]", store_class.record.format[1:])):
+        field = struct.Struct("<" + code)
+        layout[name] = (offset, field)
+        offset += field.size
+    return layout
+
+
+STORE_CLASSES = {cls.record.size: cls for cls in (PosChainStore, PowChainStore)}
+
+
+class BlockRecord:
+    # Zero-copy view of one record; fields are unpacked on access.
+    __slots__ = ("_reader", "_offset", "height")
+
+    def __init__(self, reader, height):
+        self._reader = reader
+        self._offset = (height - 1) * reader.record_size
+        self.height = height
+
+    def _field(self, name):
+        offset, field = self._reader.layout[name]
+        return field.unpack_from(self._reader.records, self._offset + offset)[0]
+
+    @property
+    def hash_bytes(self):
+        return self._reader.records[self._offset:self._offset + 32]
+
+    @property
+    def hash(self):
+        return self.hash_bytes.hex()
+
+    @property
+    def producer(self):
+        return self._reader.names[self._field("producer")]
+
+    def __getattr__(self, name):
+        if name in self._reader.layout:
+            return self._field(name)
+        raise AttributeError(name)
+
+    def __repr__(self):
+        return f"BlockRecord(height={self.height}, producer={self.producer})"
+
+
+class ChainReader(ChainLogReader):
+    def __init__(self, path):
+        super().__init__(path)
+        store_class = STORE_CLASSES.get(self.record_size)
+        if store_class is None:
+            raise ValueError(f"{path}: unknown record size {self.record_size}")
+        self.kind = "pow" if store_class is PowChainStore else "pos"
+        self.layout = field_layout(store_class)
+
+    def __iter__(self):
+        for height in range(1, self.count + 1):
+            yield BlockRecord(self, height)
+
+    def block(self, height):
+        if not 1 <= height <= self.count:
+            raise IndexError("height out of range")
+        return BlockRecord(self, height)
+
+    def column(self, name):
+        # Iterator over one field of every block, oldest first.
+        offset, field = self.layout[name]
+        only = struct.Struct(f"<{offset}x{field.format[1:]}{self.record_size - offset - field.size}x")
+        values = map(itemgetter(0), only.iter_unpack(self.records))
+        if name == "producer":
+            return map(self.names.__getitem__, values)
+        return values
+
+    def producer_shares(self):
+        counts = Counter(self.column("producer"))
+        return {name: n / self.count for name, n in counts.most_common()}
+
+    def block_time_quantiles(self, quantiles=(0.5, 0.9, 0.99)):
+        # PoW: distribution of per-block mining time (`elapsed`).
+        times = sorted(self.column("elapsed"))
+        if not times:
+            return {}
+        return {q: times[min(len(times) - 1, int(q * len(times)))] for q in quantiles}
+
+    def summary(self):
+        result = {"kind": self.kind, "blocks": self.count, "producer_shares": self.producer_shares()}
+        if self.kind == "pow" and self.count:
+            result["mean_block_time"] = sum(self.column("elapsed")) / self.count
+            result["block_time_quantiles"] = self.block_time_quantiles()
+        return result
+
+
+if __name__ == "__main__":
+    reader = ChainReader(sys.argv[1])
+    for key, value in reader.summary().items():
+        print(f"{key}: {value}")
@@ -0,0 +1,357 @@
+# ============================================================
+#  chain_store.py – Compact columnar storage for long chains
+# ============================================================
+#
+# A chain is kept as columns instead of one Python object per block:
+# 32-byte hashes packed in a preallocated bytearray, producers as small integer
+# ids, numeric fields in `array` columns. Heights are implicit (row i is block
+# i + 1) and prev_hash is the previous row's hash, so neither is stored.
+# Indexing returns __slots__ views exposing the usual block attributes.
+#
+# A store can be attached to a ChainLog (chain_log.py): every appended row is
+# also written there as one `record`, and a reopened log is adopted without
+# parsing it. Its rows are unpacked into the columns on first access.
+# A `mirror` (shared_chain.SharedChain) receives the same records so other
+# processes can read the chain.
+#
+# Rows are encoded to JSON (block_json.py) only when a page of them is read.
+# The encodings of recently read rows are kept in a few fixed-size chunks,
+# so polls of the same pages reuse them while appends stay as cheap as the
+# columns themselves.
+
+import struct
+import threading
+import time
+from array import array
+from collections import Counter, OrderedDict
+from operator import itemgetter
+
+from block_json import pos_block_fragment, pow_block_fragment
+
+HASH_SIZE = 32
+INITIAL_CAPACITY = 1024
+GENESIS_HASH = "0" * 64
+FRAGMENT_CHUNK = 64  # rows per cached chunk of JSON fragments
+FRAGMENT_CHUNKS = 32  # chunks kept per store, least recently read dropped
+
+
+def format_timestamp(created):
+    return time.strftime("%H:%M:%S", time.localtime(created))
+
+
+class PosBlockView:
+    __slots__ = ("_store", "_i")
+
+    def __init__(self, store, i):
+        self._store = store
+        self._i = i
+
+    @property
+    def index(self):
+        return self._i + 1
+
+    @property
+    def hash(self):
+        return self._store.hash_at(self._i)
+
+    @property
+    def prev_hash(self):
+        if self._i == 0:
+            return self._store.genesis_hash
+        return self._store.hash_at(self._i - 1)
+
+    @property
+    def producer(self):
+        return self._store.producers[self._store._producer_ids[self._i]]
+
+    @property
+    def created(self):
+        return self._store._created[self._i]
+
+    @property
+    def timestamp(self):
+        return format_timestamp(self.created)
+
+    def __repr__(self):
+        return f"{type(self).__name__}(height={self.index}, producer={self.producer})"
+
+
+class PowBlockView(PosBlockView):
+    __slots__ = ()
+
+    @property
+    def difficulty(self):
+        return self._store._difficulty[self._i]
+
+    @property
+    def nonce(self):
+        return self._store._nonce[self._i]
+
+    @property
+    def attempts(self):
+        return self._store._attempts[self._i]
+
+    @property
+    def elapsed(self):
+        return self._store._elapsed[self._i]
+
+
+class PosChainStore:
+    __slots__ = (
+        "genesis_hash", "producers", "log", "mirror", "_producer_index",
+        "_hashes", "_producer_ids", "_created", "_len", "_pending", "_load_lock",
+        "_fragment_chunks", "_fragment_lock",
+    )
+    view_class = PosBlockView
+    encode = staticmethod(pos_block_fragment)
+    record = struct.Struct("<32sHd")
+    fields = ("hash", "producer", "created")
+
+    def __init__(self, capacity=INITIAL_CAPACITY, genesis_hash=GENESIS_HASH):
+        self.genesis_hash = genesis_hash
+        self.producers = []
+        self.log = None
+        self.mirror = None
+        self._producer_index = {}
+        self._hashes = bytearray(max(1, capacity) * HASH_SIZE)
+        self._producer_ids = array("H")  # up to 65535 distinct producers
+        self._created = array("d")
+        self._len = 0
+        self._pending = None
+        self._load_lock = threading.Lock()
+        self._fragment_chunks = OrderedDict()  # chunk number -> FRAGMENT_CHUNK fragments
+        self._fragment_lock = threading.Lock()
+
+    def __len__(self):
+        return self._len
+
+    def __iter__(self):
+        self._load()
+        view = self.view_class
+        for i in range(self._len):
+            yield view(self, i)
+
+    def __getitem__(self, key):
+        self._load()
+        if isinstance(key, slice):
+            view = self.view_class
+            return [view(self, i) for i in range(*key.indices(self._len))]
+        if key < 0:
+            key += self._len
+        if not 0 <= key < self._len:
+            raise IndexError("chain index out of range")
+        return self.view_class(self, key)
+
+    def hash_at(self, i):
+        if self._pending is not None:
+            return self._pending.record(self.record, i)[0].hex()
+        return self._hashes[i * HASH_SIZE:(i + 1) * HASH_SIZE].hex()
+
+    @property
+    def last_hash(self):
+        return self.hash_at(self._len - 1) if self._len else self.genesis_hash
+
+    def producer_id(self, name):
+        pid = self._producer_index.get(name)
+        if pid is None:
+            pid = len(self.producers)
+            self.producers.append(name)
+            self._producer_index[name] = pid
+            if self.log is not None:
+                self.log.add_name(name)
+            if self.mirror is not None:
+                self.mirror.add_name(name)
+        return pid
+
+    def fragments(self, start, stop):
+        # JSON fragments of rows [start, stop). Complete chunks are cached;
+        # the partial chunk at the tip is encoded on every read.
+        self._load()
+        encode, view = self.encode, self.view_class
+        chunks = self._fragment_chunks
+        out = []
+        for n in range(start // FRAGMENT_CHUNK, (stop - 1) // FRAGMENT_CHUNK + 1):
+            lo = n * FRAGMENT_CHUNK
+            hi = lo + FRAGMENT_CHUNK
+            with self._fragment_lock:
+                chunk = chunks.get(n)
+                if chunk is not None:
+                    chunks.move_to_end(n)
+            if chunk is None:
+                if hi > self._len:
+                    chunk = [encode(view(self, i)) for i in range(max(lo, start), stop)]
+                    out.extend(chunk)
+                    continue
+                chunk = [encode(view(self, i)) for i in range(lo, hi)]
+                with self._fragment_lock:
+                    chunks[n] = chunk
+                    while len(chunks) > FRAGMENT_CHUNKS:
+                        chunks.popitem(last=False)
+            out.extend(chunk[max(lo, start) - lo:min(hi, stop) - lo])
+        return out
+
+    def producer_counts(self):
+        # Blocks per producer name; on a restored log this is one C-level pass
+        # over the producer field only.
+        if self._pending is not None:
+            only_producer = struct.Struct(f"<{HASH_SIZE}xH{self.record.size - HASH_SIZE - 2}x")
+            ids = map(itemgetter(0), only_producer.iter_unpack(self._pending.records))
+        else:
+            ids = self._producer_ids
+        return {self.producers[pid]: n for pid, n in Counter(ids).items()}
+
+    def row(self, i):
+        # Fields of row i, in `fields` order; read from the mapped log if
+        # the store was not unpacked yet.
+        if i < 0:
+            i += self._len
+        if self._pending is not None:
+            return self._pending.record(self.record, i)
+        if not 0 <= i < self._len:
+            raise IndexError("chain index out of range")
+        return self._row_at(i)
+
+    def _row(self, block):
+        return (bytes.fromhex(block.hash), self.producer_id(block.producer), block.created)
+
+    def _row_at(self, i):
+        return (
+            bytes(self._hashes[i * HASH_SIZE:(i + 1) * HASH_SIZE]),
+            self._producer_ids[i],
+            self._created[i],
+        )
+
+    def records(self):
+        # Packed log records for every block, oldest first.
+        self._load()
+        pack = self.record.pack
+        for i in range(self._len):
+            yield pack(*self._row_at(i))
+
+    def _reserve(self, end):
+        # Room for hashes up to byte `end`, doubling the buffer.
+        if end > len(self._hashes):
+            self._hashes.extend(bytes(max(len(self._hashes), end - len(self._hashes))))
+
+    def _store_row(self, i, row):
+        end = (i + 1) * HASH_SIZE
+        self._reserve(end)
+        self._hashes[end - HASH_SIZE:end] = row[0]
+        self._producer_ids.append(row[1])
+        self._created.append(row[2])
+
+    def append(self, block):
+        # Columns are filled before the length moves, so concurrent readers
+        # only ever see complete rows.
+        self._load()
+        row = self._row(block)
+        self._store_row(self._len, row)
+        self._len += 1
+        if self.log is not None or self.mirror is not None:
+            record = self.record.pack(*row)
+            if self.log is not None:
+                self.log.append(record)
+            if self.mirror is not None:
+                self.mirror.append(record)
+
+    def extend(self, blocks):
+        for block in blocks:
+            self.append(block)
+
+    def extend_digests(self, digests, producers, created):
+        # PoS rows in bulk: `digests` is their 32-byte hashes concatenated,
+        # `producers` their producer names, all created at `created`.
+        self._load()
+        n = len(producers)
+        ids = array("H", map(self.producer_id, producers))
+        start = self._len * HASH_SIZE
+        self._reserve(start + n * HASH_SIZE)
+        self._hashes[start:start + n * HASH_SIZE] = digests
+        self._producer_ids.extend(ids)
+        self._created.extend(array("d", [created]) * n)
+        self._len += n
+        if self.log is not None or self.mirror is not None:
+            pack = self.record.pack
+            for i in range(n):
+                record = pack(digests[i * HASH_SIZE:(i + 1) * HASH_SIZE], ids[i], created)
+                if self.log is not None:
+                    self.log.append(record)
+                if self.mirror is not None:
+                    self.mirror.append(record)
+
+    def attach_log(self, log):
+        # Adopt the rows already in `log` (lazily) and mirror new rows to it.
+        if self._len:
+            raise ValueError("attach_log needs an empty store")
+        if len(log):
+            reader = log.reader()
+            self.producers = list(reader.names)
+            self._producer_index = {name: pid for pid, name in enumerate(self.producers)}
+            self._pending = reader
+            self._len = len(reader)
+        self.log = log
+
+    def attach_mirror(self, mirror):
+        # Start `mirror` over with this store's names and newest rows.
+        first = max(0, self._len - mirror.capacity)
+        mirror.reset(first)
+        for name in self.producers:
+            mirror.add_name(name)
+        pack = self.record.pack
+        for i in range(first, self._len):
+            mirror.append(pack(*self.row(i)))
+        self.mirror = mirror
+
+    def detach_log(self):
+        self.log = None
+        with self._load_lock:
+            if self._pending is not None:
+                self._pending.close()
+                self._pending = None
+                self._len = 0
+                self._fragment_chunks = OrderedDict()
+
+    def _load(self):
+        if self._pending is None:
+            return
+        with self._load_lock:
+            reader = self._pending
+            if reader is None:
+                return
+            self._hashes = bytearray(max(len(reader) * 2, INITIAL_CAPACITY) * HASH_SIZE)
+            for i, row in enumerate(self.record.iter_unpack(reader.records)):
+                self._store_row(i, row)
+            self._pending = None
+            reader.close()
+
+
+class PowChainStore(PosChainStore):
+    __slots__ = ("_difficulty", "_nonce", "_attempts", "_elapsed")
+    view_class = PowBlockView
+    encode = staticmethod(pow_block_fragment)
+    record = struct.Struct("<32sHddqqd")
+    fields = PosChainStore.fields + ("difficulty", "nonce", "attempts", "elapsed")
+
+    def __init__(self, capacity=INITIAL_CAPACITY, genesis_hash=GENESIS_HASH):
+        super().__init__(capacity, genesis_hash)
+        self._difficulty = array("d")  # fractional difficulty (retarget.py)
+        self._nonce = array("q")
+        self._attempts = array("q")
+        self._elapsed = array("d")
+
+    def _row(self, block):
+        return super()._row(block) + (
+            block.difficulty, block.nonce, block.attempts, block.elapsed
+        )
+
+    def _row_at(self, i):
+        return super()._row_at(i) + (
+            self._difficulty[i], self._nonce[i], self._attempts[i], self._elapsed[i]
+        )
+
+    def _store_row(self, i, row):
+        super()._store_row(i, row)
+        self._difficulty.append(row[3])
+        self._nonce.append(row[4])
+        self._attempts.append(row[5])
+        self._elapsed.append(row[6])
@@ -0,0 +1,109 @@
+# ============================================================
+#  events.py – Server-Sent Events broker
+# ============================================================
+#
+# Publishers run on any thread. A subscriber either owns a thread-safe
+# queue (WSGI streams, read by stream()) or lives on an asyncio event loop
+# (asgi.py), which gets its messages through call_soon_threadsafe.
+
+import asyncio
+import json
+import queue
+import threading
+
+# Messages buffered per client before it is considered too slow and dropped
+# (the browser's EventSource reconnects and resyncs through /status).
+SUBSCRIBER_BUFFER = 1000
+KEEPALIVE_SECONDS = 15
+
+
+def hello_event(hello):
+    # First message of every stream: the state the client starts from.
+    return f"event: hello\ndata: {json.dumps(hello)}\n\n"
+
+
+class Subscription:
+    def __init__(self, maxsize):
+        self.queue = queue.Queue(maxsize)
+        self.dropped = False
+
+    def put(self, msg):
+        # False if the subscriber is too slow and must be dropped.
+        try:
+            self.queue.put_nowait(msg)
+        except queue.Full:
+            return False
+        return True
+
+
+class AsyncSubscription:
+    # Read with `await queue.get()` on `loop`; a None message means dropped.
+    def __init__(self, maxsize, loop):
+        self.queue = asyncio.Queue(maxsize)
+        self.loop = loop
+        self.dropped = False
+
+    def put(self, msg):
+        try:
+            self.loop.call_soon_threadsafe(self._put, msg)
+        except RuntimeError:  # loop closed
+            return False
+        return not self.dropped
+
+    def _put(self, msg):
+        if self.dropped:
+            return
+        try:
+            self.queue.put_nowait(msg)
+        except asyncio.QueueFull:
+            self.dropped = True
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait(None)
+
+
+class EventBroker:
+    def __init__(self, maxsize=SUBSCRIBER_BUFFER):
+        self.maxsize = maxsize
+        self._subscribers = set()
+        self._lock = threading.Lock()
+
+    def has_subscribers(self):
+        return bool(self._subscribers)
+
+    def subscribe(self, loop=None):
+        # loop: deliver to an asyncio event loop (AsyncSubscription).
+        sub = Subscription(self.maxsize) if loop is None else AsyncSubscription(self.maxsize, loop)
+        with self._lock:
+            self._subscribers.add(sub)
+        return sub
+
+    def unsubscribe(self, sub):
+        with self._lock:
+            self._subscribers.discard(sub)
+
+    def publish(self, event, data):
+        # Serialized once, shared by every subscriber.
+        if not self._subscribers:
+            return
+        msg = f"event: {event}\ndata: {json.dumps(data, separators=(',', ':'))}\n\n"
+
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for sub in subscribers:
+            if not sub.put(msg):
+                sub.dropped = True
+                self.unsubscribe(sub)
+
+    def stream(self, sub, hello=None):
+        # Generator for a text/event-stream response body.
+        try:
+            if hello is not None:
+                yield hello_event(hello)
+            while not sub.dropped:
+                try:
+                    yield sub.queue.get(timeout=KEEPALIVE_SECONDS)
+                except queue.Empty:
+                    yield ": keepalive\n\n"
+        finally:
+            self.unsubscribe(sub)
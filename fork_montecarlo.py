@@ -0,0 +1,372 @@
+# ============================================================
+#  fork_montecarlo.py – Batch Monte Carlo fork simulation
+# ============================================================
+#
+# Runs many independent fork trials (the /fork_pow and /fork_pos scenarios
+# with configurable size) on a process pool and aggregates:
+#   - win rate of each competing branch,
+#   - reorg depth histogram (blocks a node abandons when it switches branch),
+#   - orphan rate (blocks outside the canonical chain / blocks produced).
+#
+# Trials are split into fixed-size chunks and chunk i always uses an RNG
+# seeded from (seed, i), so results are reproducible bit-for-bit whatever the
+# number of workers.
+#
+# backend="numpy" (needs NumPy, not a hard dependency) samples the latency
+# matrix of a whole batch of trials at once (trials x nodes x branches), picks
+# each node's branch with argmin and sums stake per branch with bincount. Its
+# statistics match the pure-Python backend, but not its exact random stream.
+
+import os
+import random
+import threading
+import time
+from collections import Counter, deque
+from concurrent.futures import ProcessPoolExecutor
+
+from seeding import derive_seed
+
+try:
+    import numpy as np
+except ImportError:  # optional: only backend="numpy" needs it
+    np = None
+
+CHUNK_TRIALS = 5000
+NUMPY_BATCH_ELEMENTS = 4_000_000  # latency samples per vectorized batch
+BACKENDS = ("python", "numpy")
+DEFAULT_STAKES = (10, 20, 40, 15, 15)
+LATENCY_DISTS = ("uniform", "exponential", "normal", "lognormal")
+
+# One pool for every run; `workers` limits a run's chunks in flight on it.
+POOL_WORKERS = os.cpu_count() or 1
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def make_latency(spec):
+    # spec: {"dist": "uniform", "low": 0, "high": 1} (default),
+    #       {"dist": "exponential", "mean": m}, {"dist": "normal", "mean": m, "sd": s},
+    #       {"dist": "lognormal", "mu": mu, "sigma": sigma}
+    spec = spec or {}
+    dist = spec.get("dist", "uniform")
+    if dist == "uniform":
+        low, high = float(spec.get("low", 0.0)), float(spec.get("high", 1.0))
+        return lambda rng: rng.uniform(low, high)
+    if dist == "exponential":
+        rate = 1.0 / float(spec.get("mean", 0.5))
+        return lambda rng: rng.expovariate(rate)
+    if dist == "normal":
+        mean, sd = float(spec.get("mean", 0.5)), float(spec.get("sd", 0.15))
+        return lambda rng: max(0.0, rng.gauss(mean, sd))
+    if dist == "lognormal":
+        mu, sigma = float(spec.get("mu", -1.0)), float(spec.get("sigma", 0.5))
+        return lambda rng: rng.lognormvariate(mu, sigma)
+    raise ValueError(f"unknown latency distribution '{dist}' (use one of {', '.join(LATENCY_DISTS)})")
+
+
+def make_latency_np(spec):
+    # Same distributions as make_latency, sampled as a whole array.
+    spec = spec or {}
+    dist = spec.get("dist", "uniform")
+    if dist == "uniform":
+        low, high = float(spec.get("low", 0.0)), float(spec.get("high", 1.0))
+        return lambda gen, shape: gen.uniform(low, high, shape)
+    if dist == "exponential":
+        mean = float(spec.get("mean", 0.5))
+        return lambda gen, shape: gen.exponential(mean, shape)
+    if dist == "normal":
+        mean, sd = float(spec.get("mean", 0.5)), float(spec.get("sd", 0.15))
+        return lambda gen, shape: np.maximum(0.0, gen.normal(mean, sd, shape))
+    if dist == "lognormal":
+        mu, sigma = float(spec.get("mu", -1.0)), float(spec.get("sigma", 0.5))
+        return lambda gen, shape: gen.lognormal(mu, sigma, shape)
+    raise ValueError(f"unknown latency distribution '{dist}' (use one of {', '.join(LATENCY_DISTS)})")
+
+
+def new_stats(branches):
+    return {
+        "trials": 0,
+        "wins": [0] * branches,
+        "majority_trials": 0,
+        "majority_wins": 0,
+        "reorgs": Counter(),
+        "orphans": 0,
+        "blocks": 0,
+    }
+
+
+def merge_stats(total, part):
+    total["trials"] += part["trials"]
+    total["wins"] = [a + b for a, b in zip(total["wins"], part["wins"])]
+    total["majority_trials"] += part["majority_trials"]
+    total["majority_wins"] += part["majority_wins"]
+    total["reorgs"].update(part["reorgs"])
+    total["orphans"] += part["orphans"]
+    total["blocks"] += part["blocks"]
+    return total
+
+
+def first_seen(rng, latency, branches):
+    lats = [latency(rng) for _ in range(branches)]
+    return lats.index(min(lats))
+
+
+def pick_winner(rng, scores):
+    best = max(scores)
+    tied = [i for i, s in enumerate(scores) if s == best]
+    return tied[0] if len(tied) == 1 else rng.choice(tied)
+
+
+def pow_trial(rng, stats, nodes, branches, depth, latency, block_interval=None):
+    # Nodes follow the first branch block they receive. Each following block
+    # is mined by a uniformly random node on its own tip. A node on a shorter
+    # branch reorgs onto the longest one once that block reaches it: right
+    # away without `block_interval`, otherwise only if its latency beats the
+    # time to the next block (~ Exp(block_interval)), so it may keep mining
+    # on its stale branch and deepen the eventual reorg.
+    follow = [first_seen(rng, latency, branches) for _ in range(nodes)]
+    lengths = [1] * branches
+
+    support = [follow.count(b) for b in range(branches)]
+    majority = support.index(max(support)) if support.count(max(support)) == 1 else None
+
+    reorgs = stats["reorgs"]
+    for _ in range(depth):
+        b = follow[rng.randrange(nodes)]
+        lengths[b] += 1
+        longest = lengths[b]
+        if all(n < longest for i, n in enumerate(lengths) if i != b):
+            gap = rng.expovariate(1.0 / block_interval) if block_interval else None
+            for i, f in enumerate(follow):
+                if f != b and (gap is None or latency(rng) < gap):
+                    reorgs[lengths[f]] += 1
+                    follow[i] = b
+
+    winner = pick_winner(rng, lengths)
+    for f in follow:
+        if f != winner:
+            reorgs[lengths[f]] += 1
+
+    stats["trials"] += 1
+    stats["wins"][winner] += 1
+    if majority is not None:
+        stats["majority_trials"] += 1
+        stats["majority_wins"] += majority == winner
+    stats["blocks"] += sum(lengths)
+    stats["orphans"] += sum(lengths) - lengths[winner]
+
+
+def pos_trial(rng, stats, stakes, branches, depth, latency):
+    # Validators vote for the first branch block they receive; the branch
+    # with the most stake becomes canonical and `depth` more blocks follow it.
+    stake_on = [0] * branches
+    votes = [0] * branches
+    follow = []
+    for stake in stakes:
+        b = first_seen(rng, latency, branches)
+        stake_on[b] += stake
+        votes[b] += 1
+        follow.append(b)
+
+    winner = pick_winner(rng, stake_on)
+    by_count = [i for i, n in enumerate(votes) if n == max(votes)]
+
+    stats["reorgs"][1] += sum(1 for f in follow if f != winner)
+    stats["trials"] += 1
+    stats["wins"][winner] += 1
+    if len(by_count) == 1:
+        stats["majority_trials"] += 1
+        stats["majority_wins"] += by_count[0] == winner
+    stats["blocks"] += branches + depth
+    stats["orphans"] += branches - 1
+
+
+def pick_winners_np(gen, scores):
+    # Row-wise argmax with ties broken uniformly at random.
+    tied = scores == scores.max(axis=1, keepdims=True)
+    return np.argmax(tied * gen.random(scores.shape), axis=1)
+
+
+def per_trial_counts(follow, branches, weights=None):
+    # (trials, nodes) branch choices -> (trials, branches) totals, one bincount.
+    trials = follow.shape[0]
+    keys = (follow + np.arange(trials)[:, None] * branches).ravel()
+    if weights is not None:
+        weights = np.broadcast_to(weights, follow.shape).ravel()
+    return np.bincount(keys, weights=weights, minlength=trials * branches).reshape(trials, branches)
+
+
+def add_reorgs(stats, depths):
+    counts = np.bincount(depths.ravel())
+    for d in np.flatnonzero(counts):
+        stats["reorgs"][int(d)] += int(counts[d])
+
+
+def pow_batch_np(gen, stats, trials, nodes, branches, depth, latency, block_interval):
+    # pow_trial for a batch of trials: the depth loop stays in Python, every
+    # step updates all trials and nodes at once.
+    rows = np.arange(trials)
+    follow = latency(gen, (trials, nodes, branches)).argmin(axis=2)
+    lengths = np.ones((trials, branches), dtype=np.int64)
+
+    support = per_trial_counts(follow, branches)
+    top = support.max(axis=1, keepdims=True)
+    has_majority = (support == top).sum(axis=1) == 1
+    majority = support.argmax(axis=1)
+
+    for _ in range(depth):
+        b = follow[rows, gen.integers(0, nodes, trials)]
+        lengths[rows, b] += 1
+        others = lengths.copy()
+        others[rows, b] = 0
+        switching = lengths[rows, b] > others.max(axis=1)
+        if not switching.any():
+            continue
+        moves = (follow != b[:, None]) & switching[:, None]
+        if block_interval:
+            gap = gen.exponential(block_interval, trials)
+            moves &= latency(gen, (trials, nodes)) < gap[:, None]
+        add_reorgs(stats, np.take_along_axis(lengths, follow, axis=1)[moves])
+        follow = np.where(moves, b[:, None], follow)
+
+    winner = pick_winners_np(gen, lengths)
+    add_reorgs(stats, np.take_along_axis(lengths, follow, axis=1)[follow != winner[:, None]])
+
+    total = lengths.sum(axis=1)
+    stats["trials"] += trials
+    stats["wins"] = [w + int(n) for w, n in zip(stats["wins"], np.bincount(winner, minlength=branches))]
+    stats["majority_trials"] += int(has_majority.sum())
+    stats["majority_wins"] += int((has_majority & (majority == winner)).sum())
+    stats["blocks"] += int(total.sum())
+    stats["orphans"] += int((total - lengths[rows, winner]).sum())
+
+
+def pos_batch_np(gen, stats, trials, stakes, branches, depth, latency):
+    follow = latency(gen, (trials, len(stakes), branches)).argmin(axis=2)
+    stake_on = per_trial_counts(follow, branches, stakes)
+    votes = per_trial_counts(follow, branches)
+
+    winner = pick_winners_np(gen, stake_on)
+    top = votes.max(axis=1, keepdims=True)
+    by_count = (votes == top).sum(axis=1) == 1
+
+    stats["reorgs"][1] += int((follow != winner[:, None]).sum())
+    stats["trials"] += trials
+    stats["wins"] = [w + int(n) for w, n in zip(stats["wins"], np.bincount(winner, minlength=branches))]
+    stats["majority_trials"] += int(by_count.sum())
+    stats["majority_wins"] += int((by_count & (votes.argmax(axis=1) == winner)).sum())
+    stats["blocks"] += trials * (branches + depth)
+    stats["orphans"] += trials * (branches - 1)
+
+
+def run_chunk_np(mode, seed, chunk, trials, params):
+    gen = np.random.default_rng(derive_seed(seed, chunk))
+    latency = make_latency_np(params.get("latency"))
+    branches = params["branches"]
+    depth = params["depth"]
+    stats = new_stats(branches)
+
+    nodes = params["nodes"]
+    batch = max(1, NUMPY_BATCH_ELEMENTS // (nodes * branches))
+    for done in range(0, trials, batch):
+        n = min(batch, trials - done)
+        if mode == "pow":
+            pow_batch_np(gen, stats, n, nodes, branches, depth, latency, params.get("block_interval"))
+        else:
+            pos_batch_np(gen, stats, n, np.asarray(params["stakes"], dtype=float), branches, depth, latency)
+    return stats
+
+
+def run_chunk(mode, seed, chunk, trials, params):
+    if params.get("backend") == "numpy":
+        return run_chunk_np(mode, seed, chunk, trials, params)
+    rng = random.Random(derive_seed(seed, chunk))
+    latency = make_latency(params.get("latency"))
+    branches = params["branches"]
+    depth = params["depth"]
+    stats = new_stats(branches)
+
+    if mode == "pow":
+        nodes = params["nodes"]
+        block_interval = params.get("block_interval")
+        for _ in range(trials):
+            pow_trial(rng, stats, nodes, branches, depth, latency, block_interval)
+    else:
+        stakes = params["stakes"]
+        for _ in range(trials):
+            pos_trial(rng, stats, stakes, branches, depth, latency)
+    return stats
+
+
+def get_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(max_workers=POOL_WORKERS)
+        return _pool
+
+
+def run_monte_carlo(mode="pow", trials=10000, nodes=5, branches=2, depth=1,
+                    latency=None, stakes=None, seed=0, workers=None, block_interval=None,
+                    backend="python"):
+    if mode not in ("pow", "pos"):
+        raise ValueError("mode must be 'pow' or 'pos'")
+    if backend not in BACKENDS:
+        raise ValueError(f"backend must be one of {', '.join(BACKENDS)}")
+    if backend == "numpy" and np is None:
+        raise ValueError("backend 'numpy' needs NumPy installed")
+    make_latency(latency)  # validate before fanning out
+
+    if mode == "pos":
+        stakes = list(stakes) if stakes else [DEFAULT_STAKES[i % len(DEFAULT_STAKES)] for i in range(nodes)]
+        nodes = len(stakes)
+    params = {
+        "nodes": nodes, "branches": branches, "depth": depth,
+        "latency": latency, "stakes": stakes, "block_interval": block_interval,
+        "backend": backend,
+    }
+
+    chunks = [
+        (i, min(CHUNK_TRIALS, trials - i * CHUNK_TRIALS))
+        for i in range((trials + CHUNK_TRIALS - 1) // CHUNK_TRIALS)
+    ]
+    workers = max(1, min(workers or POOL_WORKERS, POOL_WORKERS, len(chunks) or 1))
+
+    start = time.time()
+    total = new_stats(branches)
+    if workers == 1:
+        for chunk, n in chunks:
+            merge_stats(total, run_chunk(mode, seed, chunk, n, params))
+    else:
+        pool = get_pool()
+        futures = deque()
+        for chunk, n in chunks:
+            if len(futures) == workers:
+                merge_stats(total, futures.popleft().result())
+            futures.append(pool.submit(run_chunk, mode, seed, chunk, n, params))
+        for fut in futures:
+            merge_stats(total, fut.result())
+    elapsed = time.time() - start
+
+    return summarize(total, params, mode, seed, elapsed)
+
+
+def summarize(total, params, mode, seed, elapsed):
+    trials = total["trials"]
+    return {
+        "mode": mode,
+        "backend": params["backend"],
+        "seed": seed,
+        "trials": trials,
+        "nodes": params["nodes"],
+        "branches": params["branches"],
+        "depth": params["depth"],
+        "win_rates": [w / trials for w in total["wins"]] if trials else [],
+        "majority_win_rate": (
+            total["majority_wins"] / total["majority_trials"] if total["majority_trials"] else None
+        ),
+        "reorg_depth_histogram": {str(d): n for d, n in sorted(total["reorgs"].items())},
+        "orphan_rate": total["orphans"] / total["blocks"] if total["blocks"] else 0.0,
+        "elapsed": round(elapsed, 3),
+        "trials_per_sec": round(trials / elapsed, 1) if elapsed > 0 else None,
+    }
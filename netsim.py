@@ -0,0 +1,256 @@
+# ============================================================
+#  netsim.py – Discrete-event network simulator
+# ============================================================
+#
+# A heap-ordered event queue, a peer graph whose links carry their own
+# latency and bandwidth, and gossip relay of blocks over it: a node that
+# receives a new block validates it, then forwards it to every peer not
+# already known to have it. Arrival time over a hop is
+#   validation + link latency + block size / link bandwidth.
+#
+# mining_race() runs a PoW mining loop on top: blocks are found at random
+# (Exp(block_interval), winner proportional to hash power) on the finder's
+# current tip, so forks come from real propagation races and the orphan
+# rate depends on the topology.
+
+import heapq
+import itertools
+import random
+import time
+from array import array
+
+from block_tree import BlockTree
+from fork_montecarlo import make_latency
+
+TOPOLOGIES = ("random", "small_world", "ring", "star", "complete")
+COMPLETE_MAX_NODES = 1000
+DEFAULT_LATENCY = {"dist": "uniform", "low": 0.02, "high": 0.2}   # seconds
+DEFAULT_BANDWIDTH = {"dist": "uniform", "low": 10, "high": 100}   # Mbit/s
+DEFAULT_BLOCK_SIZE = 1_000_000                                    # bytes
+DEFAULT_VALIDATION = 0.01                                         # seconds per hop
+NEVER = float("inf")
+
+
+class Simulator:
+    def __init__(self):
+        self.now = 0.0
+        self.events = 0
+        self._queue = []
+        self._seq = itertools.count()
+
+    def schedule(self, at, handler, *args):
+        heapq.heappush(self._queue, (at, next(self._seq), handler, args))
+
+    def run(self, until=None):
+        queue = self._queue
+        pop = heapq.heappop
+        while queue:
+            if until is not None and queue[0][0] > until:
+                break
+            at, _, handler, args = pop(queue)
+            self.now = at
+            self.events += 1
+            handler(*args)
+        if until is not None:
+            self.now = max(self.now, until)
+
+
+class Network:
+    # Undirected peer graph; peers[n] is a list of (peer, latency, bytes/s).
+    def __init__(self, size, topology="random", degree=8, latency=None,
+                 bandwidth=None, rewire=0.1, rng=None):
+        if size < 2:
+            raise ValueError("a network needs at least 2 nodes")
+        if topology not in TOPOLOGIES:
+            raise ValueError(f"unknown topology '{topology}' (use one of {', '.join(TOPOLOGIES)})")
+        if topology == "complete" and size > COMPLETE_MAX_NODES:
+            raise ValueError(f"complete topology is limited to {COMPLETE_MAX_NODES} nodes")
+
+        self.size = size
+        self.topology = topology
+        self.peers = [[] for _ in range(size)]
+        self._rng = rng or random.Random()
+        self._latency = make_latency(latency or DEFAULT_LATENCY)
+        self._bandwidth = make_latency(bandwidth or DEFAULT_BANDWIDTH)
+        self._links = set()
+
+        degree = max(1, min(degree, size - 1))
+        getattr(self, "_build_" + topology)(degree, rewire)
+        del self._links
+
+    @property
+    def link_count(self):
+        return sum(map(len, self.peers)) // 2
+
+    def connect(self, a, b):
+        if a == b or (min(a, b), max(a, b)) in self._links:
+            return False
+        self._links.add((min(a, b), max(a, b)))
+        latency = self._latency(self._rng)
+        rate = max(self._bandwidth(self._rng), 1e-3) * 125_000  # Mbit/s -> bytes/s
+        self.peers[a].append((b, latency, rate))
+        self.peers[b].append((a, latency, rate))
+        return True
+
+    def _build_random(self, degree, rewire):
+        # Random spanning tree (always connected) plus outbound links up to
+        # `degree` per node, like Bitcoin's 8 outbound connections.
+        rng = self._rng
+        for n in range(1, self.size):
+            self.connect(n, rng.randrange(n))
+        for n in range(self.size):
+            for _ in range(degree - 1):
+                self.connect(n, rng.randrange(self.size))
+
+    def _build_small_world(self, degree, rewire):
+        # Watts-Strogatz: ring lattice to the next `degree // 2` nodes, each
+        # link rewired to a random node with probability `rewire`.
+        rng = self._rng
+        for n in range(self.size):
+            for k in range(1, max(1, degree // 2) + 1):
+                peer = (n + k) % self.size
+                if k > 1 and rng.random() < rewire:
+                    peer = rng.randrange(self.size)
+                self.connect(n, peer)
+
+    def _build_ring(self, degree, rewire):
+        for n in range(self.size):
+            self.connect(n, (n + 1) % self.size)
+
+    def _build_star(self, degree, rewire):
+        for n in range(1, self.size):
+            self.connect(0, n)
+
+    def _build_complete(self, degree, rewire):
+        for a in range(self.size):
+            for b in range(a + 1, self.size):
+                self.connect(a, b)
+
+
+class BlockRelay:
+    # Gossip of blocks over a Network. arrivals[block][n] is when node n
+    # first received the block (NEVER until then); `on_receive(node, block)`
+    # runs on every first receipt.
+    def __init__(self, network, sim, block_size=DEFAULT_BLOCK_SIZE,
+                 validation=DEFAULT_VALIDATION, on_receive=None):
+        self.network = network
+        self.sim = sim
+        self.block_size = block_size
+        self.validation = validation
+        self.on_receive = on_receive
+        self.arrivals = {}
+        self.messages = 0
+        self.duplicates = 0
+
+    def publish(self, node, block, at=None):
+        self.arrivals[block] = array("d", [NEVER]) * self.network.size
+        self.sim.schedule(self.sim.now if at is None else at, self._arrive, node, block, None)
+
+    def _arrive(self, node, block, sender):
+        seen = self.arrivals[block]
+        if seen[node] != NEVER:
+            self.duplicates += 1
+            return
+        now = self.sim.now
+        seen[node] = now
+        if self.on_receive is not None:
+            self.on_receive(node, block)
+
+        # Peers that already have the block decline the announcement, so only
+        # the others are sent the full block.
+        ready = now + self.validation
+        size = self.block_size
+        schedule = self.sim.schedule
+        arrive = self._arrive
+        for peer, latency, rate in self.network.peers[node]:
+            if peer != sender and seen[peer] == NEVER:
+                self.messages += 1
+                schedule(ready + latency + size / rate, arrive, peer, block, node)
+
+    def coverage_times(self, block, fractions=(0.5, 0.9, 1.0)):
+        # Time after publication until each fraction of nodes had the block.
+        times = sorted(self.arrivals[block])
+        start = times[0]
+        n = len(times)
+        return {f: times[min(n - 1, max(0, int(f * n + 0.5) - 1))] - start for f in fractions}
+
+
+def broadcast(network, origins, block_size=DEFAULT_BLOCK_SIZE, validation=DEFAULT_VALIDATION):
+    # Publish one block per origin node at t=0 and let them race; returns
+    # arrival times per node for each block and the simulator.
+    sim = Simulator()
+    relay = BlockRelay(network, sim, block_size, validation)
+    for block, node in enumerate(origins):
+        relay.publish(node, block, at=0.0)
+    sim.run()
+    return [relay.arrivals[b] for b in range(len(origins))], sim
+
+
+def mining_race(network, blocks=100, block_interval=600.0, hash_power=None,
+                block_size=DEFAULT_BLOCK_SIZE, validation=DEFAULT_VALIDATION, rng=None):
+    # `blocks` PoW blocks found network-wide. Block discovery is memoryless,
+    # so the next block is due after Exp(block_interval) and belongs to a
+    # node picked in proportion to hash power; it extends that node's tip.
+    rng = rng or random.Random()
+    size = network.size
+    weights = list(itertools.accumulate(hash_power or [1] * size))
+    if len(weights) != size:
+        raise ValueError("hash_power needs one entry per node")
+
+    sim = Simulator()
+    tree = BlockTree("GEN")
+    tips = ["GEN"] * size
+    reorgs = {}
+
+    def on_receive(node, block):
+        current = tree[tips[node]]
+        new = tree[block]
+        if new.work > current.work:
+            if new.parent is not current:
+                fork = tree[tree.common_ancestor(current.block_id, block)]
+                depth = current.height - fork.height
+                if depth:
+                    reorgs[depth] = reorgs.get(depth, 0) + 1
+            tips[node] = block
+
+    relay = BlockRelay(network, sim, block_size, validation, on_receive)
+    found = [0]
+
+    def find_block():
+        miner = rng.choices(range(size), cum_weights=weights, k=1)[0]
+        block = found[0] + 1
+        found[0] = block
+        tree.add(block, tips[miner])
+        relay.publish(miner, block)
+        if block < blocks:
+            sim.schedule(sim.now + rng.expovariate(1.0 / block_interval), find_block)
+
+    start = time.time()
+    sim.schedule(rng.expovariate(1.0 / block_interval), find_block)
+    sim.run()
+    elapsed = time.time() - start
+
+    best = min(tree.best_tips, key=str)
+    main_chain = tree.chain_length(best) - 1
+    coverage = [relay.coverage_times(b) for b in range(1, blocks + 1)]
+
+    return {
+        "nodes": size,
+        "topology": network.topology,
+        "links": network.link_count,
+        "blocks": blocks,
+        "main_chain": main_chain,
+        "orphans": blocks - main_chain,
+        "orphan_rate": (blocks - main_chain) / blocks if blocks else 0.0,
+        "reorg_depth_histogram": {str(d): n for d, n in sorted(reorgs.items())},
+        "propagation": {
+            f"p{int(f * 100)}": sum(c[f] for c in coverage) / len(coverage)
+            for f in (0.5, 0.9, 1.0)
+        } if coverage else {},
+        "messages": relay.messages,
+        "duplicates": relay.duplicates,
+        "events": sim.events,
+        "sim_time": sim.now,
+        "elapsed": round(elapsed, 3),
+        "events_per_sec": round(sim.events / elapsed, 1) if elapsed > 0 else None,
+    }
@@ -0,0 +1,74 @@
+# ============================================================
+#  offload.py – CPU-bound simulation work on a bounded process pool
+# ============================================================
+#
+# Large PoS batches and fork simulations are pure CPU work. Run on a request
+# thread they hold the GIL in the same process that serves status polls and
+# runs the mining threads, which is what makes status latency spike. An
+# Offloader runs such functions in worker processes instead. At most
+# `max_pending` calls are in flight or queued. Past that a request fails at
+# once with Overloaded (HTTP 503 + Retry-After) rather than piling up, while
+# background jobs wait for a free slot.
+#
+# Functions and arguments must be picklable: module-level functions on
+# plain data. With workers=0 they run inline on the calling thread, still
+# within the max_pending limit.
+
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+
+
+class Overloaded(Exception):
+    pass
+
+
+class Offloader:
+    def __init__(self, workers, max_pending):
+        self.workers = workers
+        self.max_pending = max_pending
+        self._slots = threading.BoundedSemaphore(max(1, max_pending))
+        self._pending = 0
+        self._lock = threading.Lock()
+        self._pool = None
+
+    @property
+    def pending(self):
+        return self._pending
+
+    def _get_pool(self):
+        with self._lock:
+            if self._pool is None:
+                self._pool = ProcessPoolExecutor(max_workers=self.workers)
+            return self._pool
+
+    @contextmanager
+    def slot(self, wait=False):
+        # One of the max_pending places. wait=False raises Overloaded when
+        # none is free; wait=True blocks until one is.
+        if not self._slots.acquire(blocking=wait):
+            raise Overloaded(f"{self.max_pending} simulations already running or queued")
+        with self._lock:
+            self._pending += 1
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._pending -= 1
+            self._slots.release()
+
+    def call(self, fn, *args):
+        # fn(*args) in a worker process, inside a slot().
+        if not self.workers:
+            return fn(*args)
+        return self._get_pool().submit(fn, *args).result()
+
+    def run(self, fn, *args, wait=False):
+        with self.slot(wait):
+            return self.call(fn, *args)
+
+    def shutdown(self):
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=False, cancel_futures=True)
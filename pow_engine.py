@@ -0,0 +1,215 @@
+# ============================================================
+#  pow_engine.py – PoW mining engines (multi-process, simulated time)
+# ============================================================
+
+import hashlib
+import itertools
+import multiprocessing
+import os
+import random
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+# Nonces handed out per work item to a miner with hash_power == 1.0.
+CHUNK_SIZE = 20000
+# Hashes between two checks of the shared stop flag.
+STOP_CHECK = 1024
+# Simulated hashes per second for a miner with hash_power == 1.0.
+SIM_HASH_RATE = 50_000
+
+_stop_event = None
+
+# ======================= HASHING KERNEL =======================
+# Block hash = sha256(f"{prev_hash}|{nonce}|{miner}"). The "{prev_hash}|"
+# prefix is hashed once and its midstate copied per attempt, so only the nonce
+# and the "|{miner}" suffix are fed to SHA-256 each time. Difficulty is checked
+# on the raw digest against a 256-bit target: digest < 16 ** (64 - d), i.e.
+# d leading zero hex digits for whole d. Fractional d gives targets in between.
+
+
+def target_value(difficulty):
+    # The target as an integer; exact for whole difficulties.
+    bits = 256 - 4 * min(difficulty, 64)
+    if bits == int(bits):
+        return 1 << int(bits)
+    return int(2.0 ** bits)
+
+
+def difficulty_target(difficulty):
+    # Big-endian bytes of the target: comparing digests to it as bytes is
+    # the 256-bit integer comparison.
+    if difficulty <= 0:
+        return b"\xff" * 33  # above every 32-byte digest
+    return target_value(difficulty).to_bytes(32, "big")
+
+
+def expected_hashes(difficulty):
+    # Mean number of attempts per valid hash: 2**256 / target.
+    return 16 ** max(0, min(difficulty, 64))
+
+
+def block_midstate(prev_hash, miner_name):
+    return hashlib.sha256(f"{prev_hash}|".encode()), f"|{miner_name}".encode()
+
+
+def scan_nonces(prev_hash, difficulty, miner_name, start, end):
+    # Returns (nonce, hex hash) of the first valid nonce in [start, end), or None.
+    base, suffix = block_midstate(prev_hash, miner_name)
+    copy = base.copy
+    target = difficulty_target(difficulty)
+
+    for nonce in range(start, end):
+        h = copy()
+        h.update(str(nonce).encode() + suffix)
+        if h.digest() < target:
+            return nonce, h.hexdigest()
+    return None
+
+
+def _init_worker(stop_event):
+    global _stop_event
+    _stop_event = stop_event
+
+
+def mine_chunk(prev_hash, difficulty, miner_name, start, count):
+    # Scan nonces [start, start + count) for one miner.
+    # Returns ((nonce, hash) or None, hashes tried).
+    stop = _stop_event
+    end = start + count
+    nonce = start
+
+    while nonce < end:
+        if stop is not None and stop.is_set():
+            break
+        batch_end = min(nonce + STOP_CHECK, end)
+        found = scan_nonces(prev_hash, difficulty, miner_name, nonce, batch_end)
+        if found is not None:
+            return found, found[0] - start + 1
+        nonce = batch_end
+
+    return None, nonce - start
+
+
+class ProcessMiningEngine:
+    def __init__(self, workers=None, chunk_size=CHUNK_SIZE):
+        self.workers = workers or os.cpu_count() or 1
+        self.chunk_size = chunk_size
+        self._stop = multiprocessing.Event()
+        self._pool = None
+
+    def start(self):
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.workers,
+                initializer=_init_worker,
+                initargs=(self._stop,),
+            )
+
+    def shutdown(self):
+        if self._pool is not None:
+            self._stop.set()
+            self._pool.shutdown(wait=True, cancel_futures=True)
+            self._pool = None
+
+    def mine_block(self, miners, prev_hash, difficulty, keep_going=lambda: True):
+        # Every miner searches its own nonce space ("prev|nonce|name"), so the
+        # space is split into chunks handed out round-robin. A chunk is
+        # hash_power times CHUNK_SIZE long, which scales each miner's share of
+        # the pool's throughput by its hash_power.
+        self.start()
+        self._stop.clear()
+
+        next_nonce = {m.name: 0 for m in miners}
+        pending = {}
+        turn = 0
+
+        for m in miners:
+            m.status = "Mining"
+            m.attempts = 0
+
+        def submit():
+            nonlocal turn
+            m = miners[turn % len(miners)]
+            turn += 1
+            count = max(1, int(self.chunk_size * m.hash_power))
+            fut = self._pool.submit(
+                mine_chunk, prev_hash, difficulty, m.name, next_nonce[m.name], count
+            )
+            next_nonce[m.name] += count
+            pending[fut] = m
+
+        start_time = time.time()
+        while len(pending) < self.workers * 2:
+            submit()
+
+        winner = None
+        while winner is None and pending:
+            done, _ = wait(pending, timeout=0.5, return_when=FIRST_COMPLETED)
+            for fut in done:
+                m = pending.pop(fut)
+                found, tried = fut.result()
+                m.attempts += tried
+                if found is not None and winner is None:
+                    winner = (m, found)
+
+            if winner is None:
+                if not keep_going():
+                    break
+                while len(pending) < self.workers * 2:
+                    submit()
+
+        elapsed = time.time() - start_time
+
+        # Cooperative cancel: running chunks see the flag within STOP_CHECK
+        # hashes, queued ones return immediately.
+        self._stop.set()
+        for fut, m in pending.items():
+            _, tried = fut.result()
+            m.attempts += tried
+
+        for m in miners:
+            m.status = "Stopped"
+
+        if winner is None:
+            return None
+
+        m, (nonce, h) = winner
+        m.status = "Winner"
+        return m.name, h, nonce, elapsed, m.attempts
+
+
+# ======================= SIMULATED TIME =======================
+
+
+class SimulatedMiningEngine:
+    # Statistical block discovery instead of hashing. With a total hash rate
+    # R, the first valid hash arrives after Exp(R / expected_hashes(d))
+    # seconds and belongs to each miner with probability hash_power / total.
+    # Block times are simulated: `clock` advances by each block's elapsed
+    # time, so hours of mining take milliseconds.
+    def __init__(self, hash_rate=SIM_HASH_RATE, clock=None, rng=None):
+        self.hash_rate = hash_rate
+        self.clock = time.time() if clock is None else clock
+        self.rng = rng or random.Random()
+
+    def mine_block(self, miners, prev_hash, difficulty, keep_going=None):
+        rng = self.rng
+        weights = list(itertools.accumulate(m.hash_power for m in miners))
+        total_rate = weights[-1] * self.hash_rate
+        elapsed = rng.expovariate(total_rate / expected_hashes(difficulty))
+        winner = rng.choices(miners, cum_weights=weights, k=1)[0]
+
+        for m in miners:
+            m.attempts = int(m.hash_power * self.hash_rate * elapsed)
+            m.status = "Stopped"
+        winner.status = "Winner"
+        winner.attempts = max(1, winner.attempts)
+
+        # No real proof of work: the header hash is reduced modulo the target,
+        # so it still satisfies it.
+        nonce = rng.getrandbits(62)
+        h = hashlib.sha256(f"{prev_hash}|{nonce}|{winner.name}".encode()).digest()
+        h = format(int.from_bytes(h, "big") % target_value(max(difficulty, 0)), "064x")
+
+        self.clock += elapsed
+        return winner.name, h, nonce, elapsed, winner.attempts
@@ -0,0 +1,191 @@
+# ============================================================
+#  retarget.py – Difficulty retargeting algorithms
+# ============================================================
+#
+# Difficulty is measured in leading zero hex digits, as before, but may be
+# fractional: d means a target of 2**(256 - 4d), i.e. 16**d expected hashes
+# per block, and pow_engine.difficulty_target compares digests against that
+# 256-bit integer. Algorithms work on "work" (16**d) and only convert back.
+#
+#   step    legacy rule: +-1 digit when a block is 2x off target (16x work)
+#   window  Bitcoin style: every `interval` blocks, rescale by the last
+#           `window` block times (clamped to 4x either way)
+#   ema     per-block exponential moving average (Eliosoff's simple EMA)
+#   lwma    per-block linearly weighted moving average (zawy12's LWMA)
+#
+# The window statistics are rolling sums updated in O(1) per block.
+
+import math
+from collections import deque
+
+MIN_DIFFICULTY = 1.0
+MAX_ADJUST = 4.0          # window/lwma: max work change per retarget
+MAX_SOLVETIME = 6.0       # ema/lwma: block times clamped to 6x the target
+MIN_SOLVETIME = 0.1       # ema: and to at least 1/10 of it
+MIN_WEIGHTED = 0.1        # lwma: weighted time sum floored at k * T / 10
+PRECISION = 6             # decimal digits kept on difficulty
+
+
+def to_work(difficulty):
+    return 16.0 ** difficulty
+
+
+def from_work(work):
+    return math.log(work, 16)
+
+
+def change_action(old, new):
+    if new > old:
+        return "Increase"
+    if new < old:
+        return "Decrease"
+    return "Stable"
+
+
+class Retarget:
+    name = None
+
+    def __init__(self, target_time, min_difficulty=MIN_DIFFICULTY):
+        self.target_time = target_time
+        self.min_difficulty = min_difficulty
+
+    def next_difficulty(self, difficulty, block_time):
+        # Difficulty for the next block after one mined at `difficulty` in
+        # `block_time` seconds; returns (difficulty, action).
+        new = round(max(self.min_difficulty, self._next(difficulty, block_time)), PRECISION)
+        return new, change_action(difficulty, new)
+
+    def prime(self, history):
+        # Replay (difficulty, block_time) pairs, oldest first, e.g. the tail
+        # of a restored chain, so windowed algorithms start warm.
+        for difficulty, block_time in history:
+            self._next(difficulty, block_time)
+
+    def params(self):
+        return {"algorithm": self.name, "target_time": self.target_time}
+
+    def reset(self):
+        pass
+
+    def _next(self, difficulty, block_time):
+        raise NotImplementedError
+
+
+class StepRetarget(Retarget):
+    name = "step"
+
+    def _next(self, difficulty, block_time):
+        if block_time < self.target_time * 0.5:
+            return difficulty + 1
+        if block_time > self.target_time * 2:
+            return difficulty - 1
+        return difficulty
+
+
+class WindowRetarget(Retarget):
+    name = "window"
+
+    def __init__(self, target_time, window=20, interval=None, min_difficulty=MIN_DIFFICULTY):
+        super().__init__(target_time, min_difficulty)
+        self.window = max(1, int(window))
+        self.interval = max(1, int(interval or window))
+        self.reset()
+
+    def reset(self):
+        self._times = deque()
+        self._sum = 0.0
+        self._since = 0
+
+    def _next(self, difficulty, block_time):
+        times = self._times
+        times.append(block_time)
+        self._sum += block_time
+        if len(times) > self.window:
+            self._sum -= times.popleft()
+
+        self._since += 1
+        if self._since < self.interval or len(times) < self.window:
+            return difficulty
+        self._since = 0
+
+        ratio = (self.target_time * len(times)) / max(self._sum, 1e-9)
+        ratio = min(MAX_ADJUST, max(1 / MAX_ADJUST, ratio))
+        return difficulty + math.log(ratio, 16)
+
+    def params(self):
+        return dict(super().params(), window=self.window, interval=self.interval)
+
+
+class EmaRetarget(Retarget):
+    # target' = target * (1 + (t / T - 1) / N): each block moves the target
+    # 1/N of the way towards what would have given the target time.
+    name = "ema"
+
+    def __init__(self, target_time, window=20, min_difficulty=MIN_DIFFICULTY):
+        super().__init__(target_time, min_difficulty)
+        self.window = max(1, int(window))
+
+    def _next(self, difficulty, block_time):
+        # With window=1 an instant block would take the log of 0.
+        t = min(max(block_time / self.target_time, MIN_SOLVETIME), MAX_SOLVETIME)
+        return difficulty - math.log(1 + (t - 1) / self.window, 16)
+
+    def params(self):
+        return dict(super().params(), window=self.window)
+
+
+class LwmaRetarget(Retarget):
+    # next work = mean work * T * k / sum(i * t_i), newest block weighted N,
+    # k = N(N + 1) / 2. The weighted sum shifts in O(1):
+    #   W' = W - sum(t) + N * t_new   (then the oldest time drops out).
+    # As in the reference LWMA the sum is floored at k * T / 10, and one
+    # block changes the work by at most MAX_ADJUST either way, so a few
+    # instant blocks in a small window cannot freeze mining.
+    name = "lwma"
+
+    def __init__(self, target_time, window=45, min_difficulty=MIN_DIFFICULTY):
+        super().__init__(target_time, min_difficulty)
+        self.window = max(1, int(window))
+        self.reset()
+
+    def reset(self):
+        self._times = deque()
+        self._works = deque()
+        self._time_sum = 0.0
+        self._weighted = 0.0
+        self._work_sum = 0.0
+
+    def _next(self, difficulty, block_time):
+        t = min(block_time, MAX_SOLVETIME * self.target_time)
+        work = to_work(difficulty)
+
+        # While the window fills, existing weights stay 1..n-1.
+        if len(self._times) == self.window:
+            self._weighted -= self._time_sum
+            self._time_sum -= self._times.popleft()
+            self._work_sum -= self._works.popleft()
+        n = len(self._times) + 1
+        self._weighted += n * t
+        self._time_sum += t
+        self._work_sum += work
+        self._times.append(t)
+        self._works.append(work)
+
+        k = n * (n + 1) / 2
+        mean_work = self._work_sum / n
+        weighted = max(self._weighted, MIN_WEIGHTED * k * self.target_time)
+        next_work = mean_work * self.target_time * k / weighted
+        return from_work(min(work * MAX_ADJUST, max(work / MAX_ADJUST, next_work)))
+
+    def params(self):
+        return dict(super().params(), window=self.window)
+
+
+ALGORITHMS = {cls.name: cls for cls in (StepRetarget, WindowRetarget, EmaRetarget, LwmaRetarget)}
+
+
+def make_retarget(algorithm, target_time, **params):
+    cls = ALGORITHMS.get(algorithm)
+    if cls is None:
+        raise ValueError(f"unknown retarget algorithm '{algorithm}' (use one of {', '.join(ALGORITHMS)})")
+    return cls(target_time, **params)
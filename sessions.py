@@ -0,0 +1,105 @@
+# ============================================================
+#  sessions.py – Isolated simulation sessions with LRU eviction
+# ============================================================
+#
+# Each client can own a session: a complete, independent simulation (its
+# own chains, miners, validators, workers and event streams) created by a
+# factory. Sessions are kept in least-recently-used order. Creating one
+# beyond `max_sessions` closes the least recently used session that is not
+# busy, and sessions untouched for `idle_timeout` seconds are closed on the
+# next lookup. A busy session (running work, a client watching its stream)
+# is in use even without requests, so it is never closed as idle.
+#
+# A session object needs `session_id`, `last_used`, `busy` and `close()`.
+
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+
+class SessionError(Exception):
+    pass
+
+
+class QuotaExceeded(Exception):
+    pass
+
+
+class SessionManager:
+    def __init__(self, factory, max_sessions=64, idle_timeout=1800.0, on_close=None):
+        self.factory = factory
+        self.max_sessions = max_sessions
+        self.idle_timeout = idle_timeout
+        self.on_close = on_close  # on_close(session, reason)
+        self._sessions = OrderedDict()  # oldest use first
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._sessions)
+
+    def sessions(self):
+        return list(self._sessions.values())
+
+    def create(self):
+        with self._lock:
+            closed = self._expire(time.time())
+            if len(self._sessions) >= self.max_sessions:
+                victim = next((s for s in self._sessions.values() if not s.busy), None)
+                if victim is None:
+                    raise QuotaExceeded(f"all {self.max_sessions} sessions are busy")
+                del self._sessions[victim.session_id]
+                closed.append((victim, "capacity"))
+            session = self.factory(uuid.uuid4().hex[:16])
+            self._sessions[session.session_id] = session
+        self._close(closed)
+        return session
+
+    def get(self, session_id):
+        now = time.time()
+        with self._lock:
+            closed = self._expire(now)
+            session = self._sessions.get(session_id)
+            if session is not None:
+                session.last_used = now
+                self._sessions.move_to_end(session_id)
+        self._close(closed)
+        if session is None:
+            raise SessionError(f"unknown session '{session_id}'")
+        return session
+
+    def remove(self, session_id):
+        with self._lock:
+            session = self._sessions.pop(session_id, None)
+        if session is None:
+            raise SessionError(f"unknown session '{session_id}'")
+        self._close([(session, "deleted")])
+
+    def close_all(self):
+        with self._lock:
+            closed = [(s, "shutdown") for s in self._sessions.values()]
+            self._sessions.clear()
+        self._close(closed)
+
+    def _expire(self, now):
+        # Least recently used first, so only the expired prefix is visited.
+        # Busy sessions found there count as used now.
+        closed = []
+        while self._sessions:
+            session = next(iter(self._sessions.values()))
+            if now - session.last_used < self.idle_timeout:
+                break
+            if session.busy:
+                session.last_used = now
+                self._sessions.move_to_end(session.session_id)
+                continue
+            del self._sessions[session.session_id]
+            closed.append((session, "idle"))
+        return closed
+
+    def _close(self, closed):
+        # Outside the lock: closing may wait for a mining loop to stop.
+        for session, reason in closed:
+            session.close()
+            if self.on_close is not None:
+                self.on_close(session, reason)
@@ -0,0 +1,381 @@
+# ============================================================
+#  shared_chain.py – Chains shared by several server processes
+# ============================================================
+#
+# With several worker processes behind one server (gunicorn -w N app:app),
+# one of them, the primary, owns the simulation. It is elected with a lock
+# file (Coordinator). The primary mirrors every appended chain record into a
+# SharedChain: a ring buffer of fixed-size records in
+# multiprocessing.shared_memory, plus the producer names and a small JSON
+# "meta" area for scalar state such as difficulty or miner counters. The
+# other workers (followers) map the same segments and answer status calls
+# from them. They send everything else to the primary over a Unix socket.
+#
+# Segment layout: header | names | meta | capacity * record_size of records.
+# Record i is stored in slot i % capacity. The single writer fills a slot
+# before it bumps `count`, so readers take no lock. They copy the slots,
+# then check that `generation` (bumped by reset) did not change and that
+# the slots were not overwritten meanwhile. Names and meta are guarded by a
+# sequence counter that is odd while they are being written.
+#
+# Followers send pickled messages, so the socket must only accept the
+# server's own processes: it lives in a directory only the current user can
+# enter (0700) and connections must prove an authkey, given by the caller
+# or else generated once into a 0600 file in that directory.
+
+import json
+import os
+import secrets
+import stat
+import struct
+import sys
+import tempfile
+import threading
+from multiprocessing import AuthenticationError, resource_tracker, shared_memory
+from multiprocessing.connection import Client, Listener
+
+from chain_store import GENESIS_HASH, format_timestamp
+
+MAGIC = b"SIMCHAIN"
+# magic, record size, capacity, count, generation, seq, names length, meta length
+HEADER = struct.Struct("<8sIIQQQII")
+COUNT_OFFSET = 16
+GENERATION_OFFSET = 24
+SEQ_OFFSET = 32
+NAMES_LEN_OFFSET = 40
+META_LEN_OFFSET = 44
+NAMES_SIZE = 64 * 1024
+META_SIZE = 64 * 1024
+READ_RETRIES = 100
+
+_u32 = struct.Struct("<I")
+_u64 = struct.Struct("<Q")
+
+
+class SharedChainError(Exception):
+    pass
+
+
+def open_segment(name, size=None):
+    # size=None attaches to an existing segment. Before Python 3.13 every
+    # process that opens a segment registers it with the resource tracker,
+    # which unlinks it when that process exits; only the creator should.
+    if size is not None:
+        try:
+            stale = shared_memory.SharedMemory(name=name)
+        except FileNotFoundError:
+            pass
+        else:
+            stale.close()
+            stale.unlink()  # left behind by a primary that crashed
+        return shared_memory.SharedMemory(name=name, create=True, size=size)
+    if sys.version_info >= (3, 13):
+        return shared_memory.SharedMemory(name=name, track=False)
+    shm = shared_memory.SharedMemory(name=name)
+    resource_tracker.unregister(shm._name, "shared_memory")
+    return shm
+
+
+class SharedChain:
+    def __init__(self, shm, owner):
+        self._shm = shm
+        self._buf = shm.buf
+        self.owner = owner
+        magic, self.record_size, self.capacity = HEADER.unpack_from(self._buf)[:3]
+        if magic != MAGIC:
+            raise SharedChainError(f"{shm.name}: not a shared chain")
+        self._names_at = HEADER.size
+        self._meta_at = self._names_at + NAMES_SIZE
+        self._records_at = self._meta_at + META_SIZE
+        self._lock = threading.Lock()
+        self._names = []
+        self._names_key = None
+
+    @classmethod
+    def create(cls, name, record_size, capacity):
+        size = HEADER.size + NAMES_SIZE + META_SIZE + record_size * capacity
+        shm = open_segment(name, size)
+        HEADER.pack_into(shm.buf, 0, MAGIC, record_size, capacity, 0, 0, 0, 0, 0)
+        return cls(shm, owner=True)
+
+    @classmethod
+    def attach(cls, name):
+        return cls(open_segment(name), owner=False)
+
+    def close(self):
+        self._buf = None
+        self._shm.close()
+        if self.owner:
+            self._shm.unlink()
+
+    # ---------------- header ----------------
+
+    @property
+    def count(self):
+        return _u64.unpack_from(self._buf, COUNT_OFFSET)[0]
+
+    @property
+    def generation(self):
+        return _u64.unpack_from(self._buf, GENERATION_OFFSET)[0]
+
+    @property
+    def oldest(self):
+        # Index of the oldest record still in the ring.
+        return max(0, self.count - self.capacity)
+
+    def _write_guarded(self, fn):
+        # Names and meta: seq is odd while fn() runs.
+        seq = _u64.unpack_from(self._buf, SEQ_OFFSET)[0]
+        _u64.pack_into(self._buf, SEQ_OFFSET, seq + 1)
+        try:
+            fn()
+        finally:
+            _u64.pack_into(self._buf, SEQ_OFFSET, seq + 2)
+
+    def _read_guarded(self, fn):
+        for _ in range(READ_RETRIES):
+            seq = _u64.unpack_from(self._buf, SEQ_OFFSET)[0]
+            if seq % 2 == 0:
+                value = fn()
+                if _u64.unpack_from(self._buf, SEQ_OFFSET)[0] == seq:
+                    return value
+        raise SharedChainError("shared chain is being rewritten")
+
+    # ---------------- writer (ChainStore mirror) ----------------
+
+    def reset(self, count=0):
+        # Empty the chain; the next record appended is record `count`.
+        with self._lock:
+            def clear():
+                _u64.pack_into(self._buf, COUNT_OFFSET, count)
+                _u64.pack_into(self._buf, GENERATION_OFFSET, self.generation + 1)
+                _u32.pack_into(self._buf, NAMES_LEN_OFFSET, 0)
+                _u32.pack_into(self._buf, META_LEN_OFFSET, 0)
+            self._write_guarded(clear)
+
+    def add_name(self, name):
+        # Producer ids are positions in this list, as in the chain store.
+        with self._lock:
+            names_len = _u32.unpack_from(self._buf, NAMES_LEN_OFFSET)[0]
+            data = name.encode() + b"\n"
+            if names_len + len(data) > NAMES_SIZE:
+                raise SharedChainError("shared chain names table is full")
+
+            def write():
+                at = self._names_at + names_len
+                self._buf[at:at + len(data)] = data
+                _u32.pack_into(self._buf, NAMES_LEN_OFFSET, names_len + len(data))
+            self._write_guarded(write)
+
+    def append(self, record):
+        with self._lock:
+            count = self.count
+            at = self._records_at + (count % self.capacity) * self.record_size
+            self._buf[at:at + self.record_size] = record
+            _u64.pack_into(self._buf, COUNT_OFFSET, count + 1)
+
+    def set_meta(self, data):
+        raw = json.dumps(data, separators=(",", ":")).encode()
+        if len(raw) > META_SIZE:
+            raise SharedChainError("shared chain meta is too large")
+        with self._lock:
+            def write():
+                self._buf[self._meta_at:self._meta_at + len(raw)] = raw
+                _u32.pack_into(self._buf, META_LEN_OFFSET, len(raw))
+            self._write_guarded(write)
+
+    # ---------------- reader ----------------
+
+    def names(self):
+        # Cached until the names table changes.
+        def read():
+            key = (self.generation, _u32.unpack_from(self._buf, NAMES_LEN_OFFSET)[0])
+            if key == self._names_key:
+                return key, self._names
+            raw = bytes(self._buf[self._names_at:self._names_at + key[1]])
+            return key, raw.decode().split("\n")[:-1]
+        self._names_key, self._names = self._read_guarded(read)
+        return self._names
+
+    def meta(self):
+        def read():
+            size = _u32.unpack_from(self._buf, META_LEN_OFFSET)[0]
+            return bytes(self._buf[self._meta_at:self._meta_at + size])
+        raw = self._read_guarded(read)
+        return json.loads(raw) if raw else {}
+
+    def read(self, start, stop, fmt):
+        # Records [start, stop) still in the ring, unpacked with `fmt`.
+        # -> (index of the first one returned, [rows])
+        size = self.record_size
+        for _ in range(READ_RETRIES):
+            generation, count = self.generation, self.count
+            first = max(start, count - self.capacity, 0)
+            stop = min(stop, count)
+            if first >= stop:
+                return first, []
+            # One or two contiguous slot ranges, depending on wrap-around.
+            a, b = first % self.capacity, (stop - 1) % self.capacity + 1
+            base = self._records_at
+            if a < b:
+                raw = bytes(self._buf[base + a * size:base + b * size])
+            else:
+                raw = bytes(self._buf[base + a * size:base + self.capacity * size])
+                raw += bytes(self._buf[base:base + b * size])
+            if self.generation == generation and first >= self.count - self.capacity:
+                return first, list(fmt.iter_unpack(raw))
+        raise SharedChainError("shared chain is being rewritten")
+
+
+class SharedBlock:
+    __slots__ = ("index", "prev_hash", "hash", "producer", "created",
+                 "difficulty", "nonce", "attempts", "elapsed")
+
+    @property
+    def timestamp(self):
+        return format_timestamp(self.created)
+
+
+class SharedChainView:
+    # Read-only, store-like access to a SharedChain for followers: len(),
+    # slices of blocks with the usual attributes, and their JSON fragments.
+    # Only the last `capacity` blocks are kept; `oldest` is the list position
+    # of the first of them, whose prev_hash is unknown (None).
+    def __init__(self, shared, store_class):
+        self.shared = shared
+        self.record = store_class.record
+        self.fields = store_class.fields
+        self.encode = store_class.encode
+
+    def __len__(self):
+        return self.shared.count
+
+    @property
+    def oldest(self):
+        return self.shared.oldest
+
+    def __getitem__(self, key):
+        if not isinstance(key, slice):
+            raise TypeError("shared chains are read by slice")
+        start, stop, _ = key.indices(len(self))
+        # One extra record in front for the first block's prev_hash.
+        first, rows = self.shared.read(max(start - 1, 0), stop, self.record)
+        names = self.shared.names()
+        prev_hash = GENESIS_HASH if first == 0 else None
+
+        blocks = []
+        for i, row in enumerate(rows, first):
+            h = row[0].hex()
+            if i >= start:
+                b = SharedBlock()
+                b.index = i + 1
+                b.prev_hash = prev_hash
+                for name, value in zip(self.fields, row):
+                    setattr(b, name, value)
+                b.hash = h
+                b.producer = names[row[1]]
+                blocks.append(b)
+            prev_hash = h
+        return blocks
+
+    def fragments(self, start, stop):
+        # Encoded on every call; the ring is rewritten under the reader.
+        return [self.encode(b) for b in self[start:stop]]
+
+
+def private_directory(path):
+    # `path`, created 0700 if needed; refused if someone else could use it.
+    try:
+        os.mkdir(path, 0o700)
+    except FileExistsError:
+        pass
+    info = os.lstat(path)
+    if (not stat.S_ISDIR(info.st_mode) or info.st_uid != os.getuid()
+            or stat.S_IMODE(info.st_mode) & 0o077):
+        raise SharedChainError(f"{path}: not a private directory of this user")
+    return path
+
+
+def load_authkey(path):
+    # The key in `path`, generated (0600) by the first process to ask.
+    if not os.path.exists(path):
+        tmp = f"{path}.{os.getpid()}"
+        fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+        with os.fdopen(fd, "w") as f:
+            f.write(secrets.token_hex(32))
+        try:
+            os.link(tmp, path)  # never replaces a key another process wrote
+        except FileExistsError:
+            pass
+        finally:
+            os.unlink(tmp)
+    with open(path) as f:
+        return f.read().strip().encode()
+
+
+class Coordinator:
+    # Elects one primary among the processes sharing `name` (an exclusive
+    # lock on a file, released by the OS when the primary exits) and
+    # connects followers to it over a Unix socket.
+    def __init__(self, name, directory=None, authkey=None):
+        directory = private_directory(
+            directory or os.path.join(tempfile.gettempdir(), f"simchain-{os.getuid()}")
+        )
+        self.lock_path = os.path.join(directory, f"{name}.lock")
+        self.address = os.path.join(directory, f"{name}.sock")
+        self.authkey = authkey or load_authkey(os.path.join(directory, f"{name}.key"))
+        self._local = threading.local()
+        self._lock_file = None
+        self.primary = self._elect()
+
+    def _elect(self):
+        import fcntl
+
+        lock_file = open(self.lock_path, "a+")
+        try:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            lock_file.close()
+            return False
+        self._lock_file = lock_file  # held for the life of the process
+        return True
+
+    def serve(self, handler):
+        # Primary: answer handler(message) for every follower message.
+        if os.path.exists(self.address):
+            os.unlink(self.address)
+        listener = Listener(self.address, "AF_UNIX", authkey=self.authkey)
+
+        def handle(conn):
+            with conn:
+                while True:
+                    try:
+                        message = conn.recv()
+                    except (EOFError, OSError):
+                        return
+                    conn.send(handler(message))
+
+        def accept():
+            while True:
+                try:
+                    conn = listener.accept()
+                except (AuthenticationError, OSError):
+                    continue  # wrong key or a client gone mid-handshake
+                threading.Thread(target=handle, args=(conn,), daemon=True).start()
+
+        threading.Thread(target=accept, daemon=True).start()
+
+    def call(self, message):
+        # Follower: one round trip to the primary over this thread's
+        # connection, reconnecting once if the primary restarted.
+        for attempt in (0, 1):
+            conn = getattr(self._local, "conn", None)
+            try:
+                if conn is None:
+                    conn = self._local.conn = Client(self.address, "AF_UNIX", authkey=self.authkey)
+                conn.send(message)
+                return conn.recv()
+            except (EOFError, OSError):
+                self._local.conn = None
+                if attempt:
+                    raise
@@ -0,0 +1,160 @@
+# ============================================================
+#  sim_tasks.py – Simulations run by the offload worker processes
+# ============================================================
+#
+# Pure functions on plain data (offload.py pickles their arguments and
+# results): the fork race and network race demos and the hash chain of a
+# PoS batch. They touch no server state, so they give the same results
+# inline or in a worker process for the same seed.
+
+import hashlib
+import random
+
+from block_tree import BlockTree
+from netsim import Network, broadcast, mining_race
+from seeding import make_rng
+
+NETSIM_MAX_NODES = 10000
+# A mining race delivers every block to every node: nodes * blocks arrivals,
+# each several events. The two limits alone would allow 10^8 of them.
+NETSIM_MAX_ARRIVALS = 1_000_000
+
+
+def pos_hash_chain(prev_hash, names, height):
+    # Hashes of PoS blocks height + 1, height + 2, ... proposed by `names`,
+    # as create_pos_block() computes them, concatenated as 32-byte digests.
+    sha256 = hashlib.sha256
+    digests = []
+    for name in names:
+        height += 1
+        digest = sha256(f"{prev_hash}|{name}|{height}".encode()).digest()
+        digests.append(digest)
+        prev_hash = digest.hex()
+    return b"".join(digests)
+
+
+# ======================= FORK =======================
+
+def block_label(i, height):
+    # A1, B1, C2, ... as in the classic two-branch demo; N<i><height> after Z.
+    letter = chr(ord("A") + i) if i < 26 else f"N{i}_"
+    return f"{letter}{height}"
+
+
+def build_network(spec, default_nodes, rng):
+    # spec: {"nodes", "topology", "degree", "latency", "bandwidth", "rewire", "seed"};
+    # without its own seed the graph is drawn from `rng`.
+    size = int(spec.get("nodes", default_nodes))
+    if size > NETSIM_MAX_NODES:
+        raise ValueError(f"at most {NETSIM_MAX_NODES} nodes")
+    return Network(
+        size,
+        topology=spec.get("topology", "random"),
+        degree=int(spec.get("degree", 8)),
+        latency=spec.get("latency"),
+        bandwidth=spec.get("bandwidth"),
+        rewire=float(spec.get("rewire", 0.1)),
+        rng=make_rng(spec["seed"], "network") if "seed" in spec else random.Random(rng.getrandbits(64))
+    )
+
+
+def network_latencies(network, branches, block_size, rng):
+    # Each branch block is published by a different random node at t=0;
+    # a node's latency to a block is its gossip arrival time.
+    if network.size >= branches:
+        origins = rng.sample(range(network.size), branches)
+    else:
+        origins = [rng.randrange(network.size) for _ in range(branches)]
+    arrivals, sim = broadcast(network, origins, block_size=block_size)
+    return [list(lats) for lats in zip(*arrivals)], sim
+
+
+def simulate_fork(nodes, branches=2, depth=1, network=None, rng=None):
+    # `branches` competing blocks at height 1, then `depth` more blocks, each
+    # extending a branch with probability proportional to its supporters,
+    # as seen by the node names in `nodes`. With `network` (a netsim spec),
+    # latencies come from gossip over a peer graph instead of independent
+    # uniform draws. Returns the JSON result only: the tree stays here.
+    rng = rng or random.Random()
+
+    blocks = BlockTree("GEN")
+    tips = {}
+
+    branch_ids = [block_label(i, 1) for i in range(branches)]
+    for b in branch_ids:
+        blocks.add(b, "GEN")
+
+    names = nodes
+    net_info = None
+    if network is not None:
+        net = build_network(network, len(nodes), rng)
+        net_lats, sim = network_latencies(net, branches, int(network.get("block_size", 1_000_000)), rng)
+        if net.size != len(nodes):
+            names = [f"Node{i + 1}" for i in range(net.size)]
+        net_info = {"topology": net.topology, "nodes": net.size, "links": net.link_count, "events": sim.events}
+
+    counts = dict.fromkeys(branch_ids, 0)
+    for i, n in enumerate(names):
+        lats = net_lats[i] if network is not None else [rng.uniform(0, 1) for _ in branch_ids]
+        picked = branch_ids[lats.index(min(lats))]
+        counts[picked] += 1
+
+        tips[n] = {"picked": picked}
+        for b, lat in zip(branch_ids, lats):
+            tips[n]["lat" + b[:-1]] = lat
+
+    branch_tip = {b: b for b in branch_ids}
+    weights = [counts[b] for b in branch_ids]
+    extension_parents = []
+
+    for i in range(branches, branches + depth):
+        branch = rng.choices(branch_ids, weights=weights, k=1)[0]
+        parent = branch_tip[branch]
+        block_id = block_label(i, blocks[parent].height + 1)
+        blocks.add(block_id, parent)
+        branch_tip[branch] = block_id
+        extension_parents.append(parent)
+
+    # Longest chain rule; ties between branches are broken at random.
+    best = [branch_tip[b] for b in branch_ids if branch_tip[b] in blocks.best_tips]
+    winner = best[0] if len(best) == 1 else rng.choice(best)
+    chain = blocks.path(winner)
+
+    tip_A, tip_B = branch_tip["A1"], branch_tip["B1"]
+
+    result = {
+        "nodes": tips,
+        "countA": counts["A1"],
+        "countB": counts["B1"],
+        "C2_parent": extension_parents[0] if extension_parents else None,
+        "chainA_tip": tip_A,
+        "chainB_tip": tip_B,
+        "lenA": blocks.chain_length(tip_A),
+        "lenB": blocks.chain_length(tip_B),
+        "branches": [
+            {
+                "branch": b,
+                "supporters": counts[b],
+                "tip": branch_tip[b],
+                "length": blocks.chain_length(branch_tip[b])
+            }
+            for b in branch_ids
+        ],
+        "canonical_chain": chain
+    }
+    if net_info is not None:
+        result["network"] = net_info
+    return result
+
+
+def network_race(spec, seed, blocks, block_interval, block_size, validation, hash_power):
+    # /fork_pow/network: a mining race over the peer graph described by `spec`.
+    nodes = int(spec.get("nodes", 1000))
+    if nodes * blocks > NETSIM_MAX_ARRIVALS:
+        raise ValueError(f"nodes * blocks must be at most {NETSIM_MAX_ARRIVALS}")
+    rng = make_rng(seed, "race")
+    net = build_network(spec, nodes, rng)
+    return mining_race(
+        net, blocks=blocks, block_interval=block_interval, hash_power=hash_power,
+        block_size=block_size, validation=validation, rng=rng
+    )
@@ -0,0 +1,19 @@
+# ============================================================
+#  fork_blocks.py – Block dict shared by the fork simulators
+# ============================================================
+
+
+class ForkBlock:
+    def __init__(self, block_id, parent_id, height=0):
+        self.block_id = block_id
+        self.parent_id = parent_id
+        self.height = height
+
+    def __repr__(self):
+        return f"{self.block_id}(parent={self.parent_id})"
+
+
+def add_block(blocks, block_id, parent_id):
+    # Height is fixed on insert, so chain length never needs a walk.
+    height = blocks[parent_id].height + 1 if parent_id is not None else 0
+    blocks[block_id] = ForkBlock(block_id, parent_id, height)
@@ -5,6 +5,8 @@
 import random
 from collections import defaultdict
 
+from fork_blocks import add_block
+
 
 class Validator:
     def __init__(self, name, stake):
@@ -12,28 +14,23 @@ class Validator:
         self.stake = stake
 
 
-class PosForkBlock:
-    def __init__(self, block_id, parent_id):
-        self.block_id = block_id
-        self.parent_id = parent_id
-
-    def __repr__(self):
-        return f"{self.block_id}(parent={self.parent_id})"
+def compute_chain_length(blocks, tip_id):
+    return blocks[tip_id].height + 1
 
 
 def get_chain_path(blocks, tip_id):
-    path = []
+    # Filled from the tip backwards into a list sized by the tip's height.
+    path = [None] * compute_chain_length(blocks, tip_id)
     cur = tip_id
-    while cur is not None:
-        path.append(cur)
-        parent = blocks[cur].parent_id
-        if parent is None:
-            break
-        cur = parent
-    return list(reversed(path))
+    for i in range(len(path) - 1, -1, -1):
+        path[i] = cur
+        cur = blocks[cur].parent_id
+    return path
+
 
+def pos_fork_sim(seed=None):
+    rng = random.Random(seed)
 
-def pos_fork_sim():
     print("\n=======================================")
     print("   PoS FORK SIMULATOR – STAKE VOTING")
     print("=======================================")
@@ -58,9 +55,9 @@ def pos_fork_sim():
     # 2. Genesis + fork A1, B1
     # -----------------------------
     blocks = {}
-    blocks["GEN"] = PosForkBlock("GEN", None)
-    blocks["A1"] = PosForkBlock("A1", "GEN")
-    blocks["B1"] = PosForkBlock("B1", "GEN")
+    add_block(blocks, "GEN", None)
+    add_block(blocks, "A1", "GEN")
+    add_block(blocks, "B1", "GEN")
 
     print("\nTạo fork tại height 1: A1 và B1 cùng là con của GEN.")
     print("GEN → A1")
@@ -77,8 +74,8 @@ def pos_fork_sim():
     stake_on_B = 0
 
     for v in validators:
-        latA = random.uniform(0, 1)
-        latB = random.uniform(0, 1)
+        latA = rng.uniform(0, 1)
+        latB = rng.uniform(0, 1)
 
         # Validator vote cho block mà nó nhận nhanh hơn
         if latA < latB:
@@ -109,7 +106,7 @@ def pos_fork_sim():
     else:
         # Nếu bằng nhau thì random pick (trong thực tế
         # giao thức PoS sẽ dùng thêm rule khác, ở đây đơn giản hoá)
-        canonical_tip = random.choice(["A1", "B1"])
+        canonical_tip = rng.choice(["A1", "B1"])
         loser_tip = "B1" if canonical_tip == "A1" else "A1"
 
     canonical_chain = get_chain_path(blocks, canonical_tip)
@@ -128,8 +125,8 @@ def pos_fork_sim():
     names = [v.name for v in validators]
     stakes = [v.stake for v in validators]
 
-    chosen_validator = random.choices(names, weights=stakes, k=1)[0]
-    blocks["C2"] = PosForkBlock("C2", canonical_tip)
+    chosen_validator = rng.choices(names, weights=stakes, k=1)[0]
+    add_block(blocks, "C2", canonical_tip)
     final_chain = get_chain_path(blocks, "C2")
 
     print(f"  - Validator được chọn: {chosen_validator}")
@@ -26,7 +26,9 @@ class Validator:
         self.stake = stake
 
 
-def pos_simulator(num_slots=20):
+def pos_simulator(num_slots=20, seed=None):
+    rng = random.Random(seed)
+
     print("\n===============================")
     print("    PROOF OF STAKE SIMULATOR")
     print("===============================")
@@ -46,7 +48,7 @@ def pos_simulator(num_slots=20):
     prev_hash = "0" * 64
 
     for height in range(1, num_slots + 1):
-        chosen = random.choices(names, weights=weights, k=1)[0]
+        chosen = rng.choices(names, weights=weights, k=1)[0]
         selection_count[chosen] += 1
 
         h = hashlib.sha256(f"{prev_hash}|{chosen}|{height}".encode()).hexdigest()
@@ -4,23 +4,11 @@
 
 import random
 
-
-class ForkBlock:
-    def __init__(self, block_id, parent_id):
-        self.block_id = block_id
-        self.parent_id = parent_id
+from fork_blocks import add_block
 
 
 def compute_chain_length(blocks, tip):
-    length = 0
-    cur = tip
-    while cur is not None:
-        length += 1
-        parent = blocks[cur].parent_id
-        if parent is None:
-            break
-        cur = parent
-    return length
+    return blocks[tip].height + 1
 
 
 def get_chain_path(blocks, tip):
@@ -35,25 +23,27 @@ def get_chain_path(blocks, tip):
     return list(reversed(path))
 
 
-def fork_resolution_sim():
+def fork_resolution_sim(seed=None):
+    rng = random.Random(seed)
+
     print("\n===============================")
     print("     FORK RESOLUTION SIM")
     print("===============================")
 
     blocks = {}
-    blocks["GEN"] = ForkBlock("GEN", None)
+    add_block(blocks, "GEN", None)
 
     # Two blocks A1, B1 created at same height
-    blocks["A1"] = ForkBlock("A1", "GEN")
-    blocks["B1"] = ForkBlock("B1", "GEN")
+    add_block(blocks, "A1", "GEN")
+    add_block(blocks, "B1", "GEN")
 
     nodes = ["Node1", "Node2", "Node3", "Node4", "Node5"]
     node_tip = {}
 
     print("\n🌐 Simulating network latency:")
     for n in nodes:
-        latA = random.uniform(0, 1)
-        latB = random.uniform(0, 1)
+        latA = rng.uniform(0, 1)
+        latB = rng.uniform(0, 1)
 
         if latA < latB:
             node_tip[n] = "A1"
@@ -70,11 +60,11 @@ def fork_resolution_sim():
     print(f"  - B1 supporters: {countB}")
 
     # New block C2 mined, attaches probabilistically
-    parent_for_C2 = random.choices(
+    parent_for_C2 = rng.choices(
         ["A1", "B1"], weights=[countA, countB], k=1
     )[0]
 
-    blocks["C2"] = ForkBlock("C2", parent_for_C2)
+    add_block(blocks, "C2", parent_for_C2)
 
     print(f"\n⛏️ Block C2 appended to {parent_for_C2}")
 
@@ -93,7 +83,7 @@ def fork_resolution_sim():
     elif lenB > lenA:
         canonical = get_chain_path(blocks, tip_B)
     else:
-        canonical = get_chain_path(blocks, random.choice([tip_A, tip_B]))
+        canonical = get_chain_path(blocks, rng.choice([tip_A, tip_B]))
 
     print("\n✅ Canonical Chain (Longest Chain Rule):")
     print("  ", " → ".join(canonical))
@@ -3,6 +3,8 @@
 # ============================================================
 
 import hashlib
+import itertools
+import math
 import random
 import time
 
@@ -27,24 +29,40 @@ class Miner:
         self.hash_power = hash_power
 
 
-def mine_block_pow(miners, prev_hash, difficulty, target_block_time=3.0):
-    prefix = "0" * difficulty
+def difficulty_target(difficulty):
+    # digest < 16 ** (64 - difficulty) as a 256-bit integer: `difficulty`
+    # leading zero hex digits when whole, a target in between when fractional.
+    if difficulty <= 0:
+        return b"\xff" * 33
+    bits = 256 - 4 * min(difficulty, 64)
+    target = 1 << int(bits) if bits == int(bits) else int(2.0 ** bits)
+    return target.to_bytes(32, "big")
+
+
+def mine_block_pow(miners, prev_hash, difficulty, target_block_time=3.0, rng=random):
+    target = difficulty_target(difficulty)
     nonce = 0
     attempts = 0
 
     names = [m.name for m in miners]
-    weights = [m.hash_power for m in miners]
+    cum_weights = list(itertools.accumulate(m.hash_power for m in miners))
+
+    # "{prev_hash}|" is hashed once; each attempt copies the midstate and only
+    # adds "{nonce}|{miner}".
+    base = hashlib.sha256(f"{prev_hash}|".encode())
+    suffixes = {name: f"|{name}".encode() for name in names}
 
     start_time = time.time()
 
     while True:
         attempts += 1
-        miner_name = random.choices(names, weights=weights, k=1)[0]
+        miner_name = rng.choices(names, cum_weights=cum_weights, k=1)[0]
 
-        msg = f"{prev_hash}|{nonce}|{miner_name}".encode()
-        h = hashlib.sha256(msg).hexdigest()
+        h = base.copy()
+        h.update(str(nonce).encode() + suffixes[miner_name])
 
-        if h.startswith(prefix):
+        if h.digest() < target:
+            h = h.hexdigest()
             elapsed = time.time() - start_time
             block = Block(
                 index=None,
@@ -71,7 +89,24 @@ def adjust_difficulty(difficulty, block_time, target_block_time=3.0):
     return difficulty
 
 
-def pow_simulator(num_blocks=5):
+def lwma_difficulty(difficulties, block_times, target_block_time=3.0, window=45):
+    # Linearly weighted moving average over the last `window` blocks (newest
+    # weighted highest); returns a fractional difficulty.
+    difficulties = difficulties[-window:]
+    block_times = [min(t, 6 * target_block_time) for t in block_times[-window:]]
+    n = len(block_times)
+    weighted = sum(i * t for i, t in enumerate(block_times, 1))
+    mean_work = sum(16.0 ** d for d in difficulties) / n
+    work = mean_work * target_block_time * n * (n + 1) / 2 / max(weighted, 1e-9)
+    difficulty = max(1.0, math.log(work, 16))
+    print(f"   ➤ LWMA difficulty → {difficulty:.3f}")
+    return difficulty
+
+
+def pow_simulator(num_blocks=5, retarget="step", seed=None):
+    # Same seed -> same miner draws; difficulty still follows wall-clock block times.
+    rng = random.Random(seed)
+
     print("\n===============================")
     print("   PROOF OF WORK SIMULATOR")
     print("===============================")
@@ -85,6 +120,8 @@ def pow_simulator(num_blocks=5):
     difficulty = 4
     target_block_time = 3.0
     blockchain = []
+    difficulties = []
+    block_times = []
 
     prev_hash = "0" * 64
 
@@ -92,7 +129,7 @@ def pow_simulator(num_blocks=5):
         print(f"\n⛏️  Mining Block #{height} (difficulty={difficulty})")
 
         block, elapsed, attempts = mine_block_pow(
-            miners, prev_hash, difficulty, target_block_time
+            miners, prev_hash, difficulty, target_block_time, rng
         )
         block.index = height
         blockchain.append(block)
@@ -103,7 +140,12 @@ def pow_simulator(num_blocks=5):
         print(f"   🔒 Hash: {block.hash[:32]}...")
 
         prev_hash = block.hash
-        difficulty = adjust_difficulty(difficulty, elapsed, target_block_time)
+        if retarget == "lwma":
+            difficulties.append(difficulty)
+            block_times.append(elapsed)
+            difficulty = lwma_difficulty(difficulties, block_times, target_block_time)
+        else:
+            difficulty = adjust_difficulty(difficulty, elapsed, target_block_time)
 
     print("\n⛓️ Final PoW Blockchain:")
     for b in blockchain: